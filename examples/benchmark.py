@@ -1,5 +1,6 @@
 from compas.geometry import Translation
 from compas.geometry import transform_points
+from compas.geometry import allclose
 import time
 
 
@@ -43,4 +44,22 @@ result2 = proxy.get(pts)
 end = time.time()
 print('transform 10k points 100 times (cloud numpy): ', end - start, 's')
 
-assert result1 == result2
+assert allclose(result1, result2)
+
+
+
+# USING CLOUD WITH A PIPELINE
+
+pipeline = proxy.pipeline()
+pipeline.add('compas.geometry.transform_points_numpy', pipeline.PREVIOUS, T)
+
+pts = [[i, 0, 0] for i in range(0, 10000)]
+
+start = time.time()
+
+result3 = pipeline.run(proxy.cache(pts), repeat=100)
+
+end = time.time()
+print('transform 10k points 100 times (cloud numpy pipeline): ', end - start, 's')
+
+assert allclose(result1, result3)
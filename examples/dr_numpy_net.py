@@ -77,7 +77,7 @@ def callback(k, xyz, crits, args):
 xyz, q, f, l, r = dr_numpy(vertices, edges, fixed, loads,
                             qpre, fpre, lpre,
                             linit, E, radius,
-                            kmax=100, callback=callback)
+                            kmax=100, callback=p.callback(callback, rate=20, coalesce=True, delta=True))
 
 
 
@@ -0,0 +1,32 @@
+import os
+import time
+from contextlib import redirect_stdout
+
+from compas_cloud import Sessions
+
+
+# a task that takes no time, so that the bookkeeping of the session is all that is measured
+def noop(i):
+    return i
+
+
+if __name__ == '__main__':
+
+    for total in [1000, 10000, 100000]:
+        s = Sessions(worker_num=4)
+        start = time.time()
+        for i in range(total):
+            s.add_task(noop, i)
+        added = time.time() - start
+
+        with open(os.devnull, 'w') as devnull, redirect_stdout(devnull):
+            s.start()
+            start = time.time()
+            cpu = time.process_time()
+            s.listen()
+            cpu = time.process_time() - cpu
+            elapsed = time.time() - start
+            s.close()
+
+        print('{:>6} tasks: add {:.1f}us, listen {:.1f}us, listen cpu {:.1f}us per task'.format(
+            total, added / total * 1e6, elapsed / total * 1e6, cpu / total * 1e6))
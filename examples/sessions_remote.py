@@ -23,3 +23,8 @@ s.add_task(func, 5)
 # kick of the taks and start to listen to the events when tasks start or finish
 s.start()
 s.listen()
+
+# more tasks can be added while the session is running, the workers wait for them until the session is closed
+s.add_task(func, 6)
+s.listen()
+s.close()
@@ -21,7 +21,10 @@ def read(*names, **kwargs):
 
 long_description = read('README.md')
 requirements = read('requirements.txt').split('\n')
-optional_requirements = {}
+optional_requirements = {
+    'compression': ['zstandard', 'lz4'],
+    'fast': ['msgpack', 'orjson'],
+}
 
 setup(
     name='compas_cloud',
@@ -5,14 +5,16 @@ from __future__ import print_function
 import compas
 
 from .proxy import Proxy
+from .pool import ProxyPool
 
 __version__ = '0.4.1'
 
-__all__ = ['Proxy']
+__all__ = ['Proxy', 'ProxyPool']
 
 __all_plugins__ = ['compas_cloud.install']
 
 if not compas.IPY:
     from .sessions import Sessions
+    from .async_proxy import AsyncProxy
 
-    __all__ += ['Sessions']
+    __all__ += ['Sessions', 'AsyncProxy']
@@ -0,0 +1,297 @@
+import asyncio
+import itertools
+import traceback
+
+import websockets
+
+from .client_websockets import open_connection
+from .proxy import cache_message
+from .proxy import parse_callbacks
+from .proxy import Callback
+from .proxy import DEDUP_THRESHOLD
+from .proxy import ServerSideError
+from .serialization import content_hash
+from .serialization import loads
+from .serialization import Codec
+from .serialization import BINARY_SUPPORT
+
+
+__all__ = ['AsyncProxy']
+
+
+class AsyncProxy():
+    """An asyncio-native proxy where every remote call is a coroutine sharing one connection.
+
+    Many coroutines can await remote calls at the same time, the replies are matched to their callers
+    by request id. Callback messages are dispatched as soon as they arrive, callbacks can be coroutine functions.
+    Errors raised by callbacks are printed, they do not stop the proxy from receiving replies.
+
+    Parameters
+    ----------
+    host : str, optional
+        The host ip of the remote server.
+        Default is ``127.0.0.1``.
+    port : int, optional
+        The port number on the remote server.
+        Default is ``9009``.
+    binary : bool, optional
+        Send numpy arrays as raw buffers if numpy is available.
+        Default is ``True``.
+
+    Notes
+    -----
+    The server has to be running already, use :class:`Proxy` with ``once=False`` or ``python -m compas_cloud.server`` to start one.
+
+    Examples
+    --------
+
+    .. code-block:: python
+
+        from compas_cloud import AsyncProxy
+
+        async def main():
+            async with AsyncProxy() as proxy:
+                transform_points_numpy = proxy.function('compas.geometry.transform_points_numpy')
+                results = await asyncio.gather(*[transform_points_numpy(pts, T) for pts in batches])
+
+    """
+
+    def __init__(self, host='127.0.0.1', port=9009, binary=True):
+        self.host = host
+        self.port = port
+        self.binary = binary and BINARY_SUPPORT
+        self.websocket = None
+        self.codec = Codec()
+        self.callbacks = {}
+        self._ids = itertools.count()
+        self._pending = {}
+        self._streams = {}
+        self._reader = None
+
+    async def __aenter__(self):
+        await self.connect()
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.disconnect()
+
+    async def connect(self):
+        """connect to the server and start dispatching the received messages"""
+        uri = "ws://{}:{}".format(self.host, str(self.port))
+        self.websocket = await open_connection(uri)
+        self.codec = Codec.from_protocol(self.websocket.subprotocol)
+        self._reader = asyncio.ensure_future(self.read())
+        print('connected to cloud using asyncio proxy!')
+
+    async def disconnect(self):
+        """close the connection to the server"""
+        await self.websocket.close()
+        await self._reader
+
+    async def read(self):
+        """receive messages until the connection closes, pending requests fail if it closes early"""
+        try:
+            async for payload in self.websocket:
+                self.dispatch(loads(payload))
+        except websockets.ConnectionClosed:
+            pass
+        finally:
+            for future in self._pending.values():
+                if not future.done():
+                    future.set_exception(ConnectionError("Connection to server closed"))
+            self._pending.clear()
+            for queue in self._streams.values():
+                queue.put_nowait({'error': ["Connection to server closed"]})
+
+    def dispatch(self, message):
+        """handle one message received from the server"""
+        if 'callback' in message:
+            cb = message['callback']
+            try:
+                result = self.callbacks[cb['id']].receive(cb)
+            except Exception:
+                traceback.print_exc()
+                return
+            if asyncio.iscoroutine(result):
+                asyncio.ensure_future(result).add_done_callback(report_error)
+        elif 'listen' in message:
+            print(*message['listen'])
+        elif 'id' not in message:
+            if message['stream'] in self._streams:
+                self._streams[message['stream']].put_nowait(message)
+        else:
+            if 'stream' in message:
+                self._streams[message['id']] = asyncio.Queue()
+            future = self._pending.pop(message['id'], None)
+            if future is not None and not future.done():
+                future.set_result(message)
+
+    def encode(self, data):
+        """encode data with the negotiated codec, ndarrays are sent as binary frames if supported"""
+        return self.codec.encode(data, binary=self.binary)
+
+    async def send_only(self, data):
+        await self.websocket.send(self.encode(data))
+
+    async def send(self, data):
+        """send data tagged with a new request id and wait for its result"""
+        if self._reader is None or self._reader.done():
+            raise ConnectionError("Connection to server closed")
+        request_id = next(self._ids)
+        data['id'] = request_id
+        future = asyncio.get_event_loop().create_future()
+        self._pending[request_id] = future
+        await self.send_only(data)
+        reply = await future
+        if 'error' in reply:
+            raise ServerSideError("".join(reply['error']))
+        if 'stream' in reply:
+            return AsyncRemoteIterator(self, request_id, reply['stream'])
+        return reply['result']
+
+    def function(self, package, cache=False, memoize=False):
+        """returns a coroutine function wrapping a function that will be executed on server side"""
+        remote = {'package': package}
+
+        async def run_function(*args, **kwargs):
+            if callable(remote['package']):
+                remote['package'] = await self.cache(remote['package'])
+            return await self.call(remote['package'], cache, args, kwargs, memoize)
+
+        return run_function
+
+    async def run(self, package, cache, *args, **kwargs):
+        """pass the arguments to remote function and wait to receive the results"""
+        return await self.call(package, cache, args, kwargs)
+
+    async def call(self, package, cache, args, kwargs, memoize=False):
+        """send a call of a remote function and wait to receive the results"""
+        args, kwargs = self.parse_callbacks(list(args), kwargs)
+        idict = {'package': package, 'cache': cache, 'args': args, 'kwargs': kwargs}
+        if memoize:
+            idict['memoize'] = True
+        return await self.send(idict)
+
+    def callback(self, function, rate=None, coalesce=False, delta=False, tolerance=0, overflow=None):
+        """wrap a callback function with a policy that limits how often the server sends its arguments, see :class:`Callback`"""
+        return Callback(function, rate, coalesce, delta, tolerance, overflow)
+
+    def parse_callbacks(self, args, kwargs):
+        """replace a callback functions with its cached reference then sending it to server"""
+        return parse_callbacks(self.callbacks, args, kwargs)
+
+    async def cache(self, data, ttl=None):
+        """cache data or function to remote server and return a reference of it, data expires after ``ttl`` seconds if given
+
+        Large data is only uploaded if the server does not have the same content yet.
+        """
+        if callable(data):
+            return await self.send(cache_message(data))
+        key, size = content_hash(data)
+        if size >= DEDUP_THRESHOLD:
+            cached = await self.send({'has': key, 'ttl': ttl})
+            if cached:
+                return cached
+        return await self.send(cache_message(data, ttl, key))
+
+    async def get(self, cached_object):
+        """get content of a cached object stored remotely"""
+        return await self.send({'get': cached_object['cached']})
+
+    async def version(self):
+        """get version info of compas cloud server side packages"""
+        return await self.send({'version': True})
+
+    async def check(self):
+        """check if server connection is good"""
+        return await self.send({'control': 'check'})
+
+    async def stats(self):
+        """get the statistics of the server cache and of memoized results"""
+        return await self.send({'control': 'stats'})
+
+    async def Sessions(self, *args, **kwargs):
+        """create a remote Sessions and return its client"""
+        sessions = AsyncSessions_client(self)
+        print(await sessions.command('create', *args, **kwargs))
+        return sessions
+
+
+def report_error(task):
+    """print the error of a coroutine callback that failed"""
+    if not task.cancelled() and task.exception() is not None:
+        traceback.print_exception(type(task.exception()), task.exception(), task.exception().__traceback__)
+
+
+class AsyncRemoteIterator():
+    """An asynchronous iterator over the values yielded by a remote generator."""
+
+    def __init__(self, proxy, stream_id, window):
+        self.proxy = proxy
+        self.id = stream_id
+        self.window = window
+        self.consumed = 0
+        self.finished = False
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if self.finished:
+            raise StopAsyncIteration
+        message = await self.proxy._streams[self.id].get()
+
+        if 'chunk' in message:
+            self.consumed += 1
+            if self.consumed >= max(1, self.window // 2):
+                await self.proxy.send_only({'ack': self.id, 'count': self.consumed})
+                self.consumed = 0
+            return message['chunk']
+
+        self.finished = True
+        del self.proxy._streams[self.id]
+        if 'error' in message:
+            raise ServerSideError("".join(message['error']))
+        raise StopAsyncIteration
+
+    async def close(self):
+        """stop the remote generator before it is exhausted"""
+        if not self.finished:
+            self.finished = True
+            del self.proxy._streams[self.id]
+            await self.proxy.send_only({'ack': self.id, 'close': True})
+
+
+class AsyncSessions_client():
+
+    def __init__(self, proxy):
+        self.proxy = proxy
+
+    async def command(self, command, *args, **kwargs):
+        idict = {'sessions': {'command': command, 'args': args, 'kwargs': kwargs}}
+        return await self.proxy.send(idict)
+
+    async def start(self):
+        print(await self.command('start'))
+
+    async def add_task(self, func, *args, **kwargs):
+        """add a task to the remote session and return its id"""
+        cached = await self.proxy.cache(func)
+        idict = {'sessions': {'command': 'add_task', 'func': cached, 'args': args, 'kwargs': kwargs}}
+        task_id = (await self.proxy.send(idict))['task']
+        print("task-{} added".format(task_id))
+        return task_id
+
+    async def result(self, task_id, cache=False):
+        """wait for a task and return its result, or a reference to the result cached on the server
+
+        The session hands out a result only once.
+        """
+        idict = {'sessions': {'command': 'result', 'task': task_id, 'cache': cache, 'args': (), 'kwargs': {}}}
+        return await self.proxy.send(idict)
+
+    async def listen(self):
+        print(await self.command('listen'))
+
+    async def close(self):
+        print(await self.command('close'))
@@ -0,0 +1,348 @@
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import os
+import pickle
+import sys
+import time
+import threading
+import uuid
+from collections import OrderedDict
+
+try:
+    from compas.data import Data
+except ImportError:
+    from compas.base import Base as Data
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+__all__ = ['Cache', 'EvictedError', 'estimate_size']
+
+
+class EvictedError(KeyError):
+    """Raised when a reference points to an entry that was evicted from the cache"""
+
+    def __str__(self):
+        return "Cached object {} was evicted from the server cache, cache it again.".format(self.args[0])
+
+
+def estimate_size(value, depth=0):
+    """estimate the memory used by a value in bytes
+
+    Arrays count with their buffers, COMPAS data objects with their data, containers with their items.
+    Memory-mapped arrays are backed by their file and count as nothing.
+    Nesting deeper than a few levels is not followed.
+    """
+    if np is not None and isinstance(value, np.ndarray):
+        return 0 if isinstance(value, np.memmap) else value.nbytes
+    if isinstance(value, Data):
+        data = value.__data__ if hasattr(value, '__data__') else value.data
+        return sys.getsizeof(value) + estimate_size(data, depth + 1)
+    size = sys.getsizeof(value, 0)
+    if depth > 8:
+        return size
+    if isinstance(value, dict):
+        size += sum(estimate_size(k, depth + 1) + estimate_size(v, depth + 1) for k, v in value.items())
+    elif isinstance(value, (list, tuple, set, frozenset)):
+        size += sum(estimate_size(item, depth + 1) for item in value)
+    return size
+
+
+class Cache(object):
+    """A bounded key-value store for data cached on the server.
+
+    Entries are evicted in least recently used order once the number of entries or their estimated memory
+    exceeds the limits, and expire after their time to live. Keys of evicted entries are remembered,
+    so that looking them up raises :class:`EvictedError` instead of a bare ``KeyError``.
+
+    With a ``directory``, evicted entries are written to disk instead of being dropped and are loaded back
+    on access: numeric ndarrays as ``.npy`` files that are memory-mapped, other values as pickles.
+    All entries are written to disk by :meth:`flush` when the server shuts down, and the entries found in the
+    directory are available again when it restarts. Entries with a time to live are never written to disk.
+    The files of the least recently used entries are deleted once they exceed ``max_disk``,
+    the file of an entry is deleted when the entry is replaced.
+
+    Parameters
+    ----------
+    max_entries : int, optional
+        The maximum number of entries in memory, unlimited by default.
+    max_memory : int, optional
+        The maximum estimated memory of all entries in bytes, unlimited by default.
+    ttl : float, optional
+        Seconds before an entry expires, unless given per entry. Entries never expire by default.
+    directory : str, optional
+        The directory of the disk tier, entries only live in memory by default.
+    max_disk : int, optional
+        The maximum size of the files in the directory in bytes, unlimited by default.
+
+    """
+
+    # number of evicted keys that are remembered for error messages
+    REMEMBER = 100000
+
+    def __init__(self, max_entries=None, max_memory=None, ttl=None, directory=None, max_disk=None):
+        self.max_entries = max_entries
+        self.max_memory = max_memory
+        self.ttl = ttl
+        self.directory = directory
+        self.max_disk = max_disk
+        self.memory = 0
+        self.disk = 0
+        self.evictions = 0
+        self.hits = 0
+        self.misses = 0
+        self._checked = 0
+        self._entries = OrderedDict()
+        self._evicted = OrderedDict()
+        # the files of the disk tier by key with their sizes, in least recently used order
+        self._files = OrderedDict()
+        self._lock = threading.RLock()
+        if directory and not os.path.isdir(directory):
+            os.makedirs(directory)
+        if directory:
+            paths = [os.path.join(directory, name) for name in os.listdir(directory) if name.endswith(('.npy', '.pickle'))]
+            for path in sorted(paths, key=os.path.getmtime):
+                key = os.path.splitext(os.path.basename(path))[0]
+                if self._path(key, '') is not None:
+                    self._record(key, path)
+
+    def __repr__(self):
+        return "Cache(entries={}, memory={})".format(len(self), self.memory)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        with self._lock:
+            if key in self._entries:
+                return not self._expired(key)
+            return self._find(key) is not None
+
+    def __getitem__(self, key):
+        with self._lock:
+            if key not in self._entries:
+                path = self._find(key)
+                if path is not None:
+                    self.hits += 1
+                    return self._load(key, path)
+                self.misses += 1
+                if key in self._evicted:
+                    raise EvictedError(key)
+                raise KeyError(key)
+            if self._expired(key):
+                self.misses += 1
+                self._evict(key)
+                raise EvictedError(key)
+            self.hits += 1
+            self._entries.move_to_end(key)
+            return self._entries[key][0]
+
+    def __setitem__(self, key, value):
+        self.set(key, value)
+
+    def __delitem__(self, key):
+        with self._lock:
+            _, size, _ = self._entries.pop(key)
+            self.memory -= size
+
+    def discard(self, key):
+        """drop an entry if it exists, also its file in the disk tier"""
+        with self._lock:
+            if key in self._entries:
+                del self[key]
+            self._delete_file(key)
+
+    def get(self, key, default=None):
+        """return the value of a key, or the default if it is not cached"""
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def set(self, key, value, ttl=None):
+        """store a value under a key, evicting the least recently used entries if the cache is full"""
+        with self._lock:
+            # the file of a replaced entry is outdated
+            self._delete_file(key)
+            self._store(key, value, ttl)
+
+    def _store(self, key, value, ttl=None):
+        ttl = ttl if ttl is not None else self.ttl
+        expires = time.time() + ttl if ttl is not None else None
+        size = estimate_size(value)
+        with self._lock:
+            if key in self._entries:
+                del self[key]
+            self._evicted.pop(key, None)
+            self._entries[key] = (value, size, expires)
+            self.memory += size
+            self.shrink()
+
+    def extend(self, key, ttl=None):
+        """keep an entry at least as long as if it was set again now, without expiry if ``ttl`` and the default are None"""
+        ttl = ttl if ttl is not None else self.ttl
+        with self._lock:
+            if key not in self._entries:
+                return
+            value, size, expires = self._entries[key]
+            if expires is None:
+                return
+            if ttl is None:
+                expires = None
+            else:
+                expires = max(expires, time.time() + ttl)
+            self._entries[key] = (value, size, expires)
+
+    def add(self, value, ttl=None):
+        """store a value under a new unique key and return the key"""
+        key = uuid.uuid4().hex
+        self.set(key, value, ttl)
+        return key
+
+    def shrink(self):
+        """evict expired entries, then least recently used entries until the cache is within its limits
+
+        The most recently used entry is always kept, even if it exceeds the memory budget on its own.
+        """
+        with self._lock:
+            now = time.time()
+            if now - self._checked > 1:
+                # expired entries are also dropped on lookup, a full scan at most once a second is enough
+                self._checked = now
+                for key in [key for key in self._entries if self._expired(key)]:
+                    self._evict(key)
+            while len(self._entries) > 1 and self._full():
+                self._evict(next(iter(self._entries)))
+
+    def flush(self):
+        """write all entries in memory to the disk tier"""
+        if not self.directory:
+            return
+        with self._lock:
+            for key in list(self._entries):
+                if not self._expired(key):
+                    self._spill(key)
+
+    def clear(self, disk=True):
+        """drop all entries, and delete their files in the disk tier unless told otherwise"""
+        with self._lock:
+            self._entries.clear()
+            self._evicted.clear()
+            self.memory = 0
+            if disk:
+                for key in list(self._files):
+                    self._delete_file(key)
+
+    def stats(self):
+        """the number of entries, their estimated memory and the number of lookups and evictions so far"""
+        return {'entries': len(self), 'memory': self.memory, 'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions,
+                'max_entries': self.max_entries, 'max_memory': self.max_memory, 'disk': self.disk, 'max_disk': self.max_disk}
+
+    def _full(self):
+        if self.max_entries is not None and len(self._entries) > self.max_entries:
+            return True
+        return self.max_memory is not None and self.memory > self.max_memory
+
+    def _expired(self, key):
+        expires = self._entries[key][2]
+        return expires is not None and expires < time.time()
+
+    def _evict(self, key):
+        if self.directory and not self._expired(key) and self._spill(key):
+            del self[key]
+            return
+        del self[key]
+        self._forget(key)
+
+    def _forget(self, key):
+        """count an entry as evicted and remember its key"""
+        self.evictions += 1
+        self._evicted[key] = True
+        if len(self._evicted) > self.REMEMBER:
+            self._evicted.popitem(last=False)
+
+    def _path(self, key, extension):
+        # keys are uuids or content hashes, anything else is never looked up on disk
+        if not self.directory or not isinstance(key, str) or not key.isalnum():
+            return None
+        return os.path.join(self.directory, key + extension)
+
+    def _find(self, key):
+        for extension in ('.npy', '.pickle'):
+            path = self._path(key, extension)
+            if path and os.path.exists(path):
+                # also files written by other processes sharing the directory
+                self._record(key, path)
+                return path
+        return None
+
+    def _record(self, key, path):
+        """count the file of an entry as most recently used, deleting the least recently used files beyond ``max_disk``"""
+        try:
+            size = os.path.getsize(path)
+        except OSError:
+            return
+        if key in self._files:
+            self.disk -= self._files[key][1]
+        self._files[key] = (path, size)
+        self._files.move_to_end(key)
+        self.disk += size
+        while self.max_disk is not None and self.disk > self.max_disk and len(self._files) > 1:
+            oldest = next(iter(self._files))
+            self._delete_file(oldest)
+            if oldest not in self._entries:
+                self._forget(oldest)
+
+    def _delete_file(self, key):
+        """delete the file of an entry from the disk tier"""
+        for extension in ('.npy', '.pickle'):
+            path = self._path(key, extension)
+            if path and os.path.exists(path):
+                try:
+                    os.remove(path)
+                except OSError as error:
+                    print("cached object {} could not be deleted from disk: {}".format(key, error))
+        if key in self._files:
+            self.disk -= self._files.pop(key)[1]
+
+    def _spill(self, key):
+        """write an entry to disk, returns False if it cannot be written"""
+        value, _, expires = self._entries[key]
+        if expires is not None or self._path(key, '') is None:
+            return False
+        numeric = np is not None and isinstance(value, np.ndarray) and value.dtype.kind in 'biufc'
+        path = self._path(key, '.npy' if numeric else '.pickle')
+        if numeric and isinstance(value, np.memmap) and value.filename == os.path.abspath(path) and os.path.exists(path):
+            # loaded from this file, changes of the copy-on-write mapping are not kept
+            self._record(key, path)
+            return True
+        temp = path + '.tmp'
+        try:
+            with open(temp, 'wb') as f:
+                if numeric:
+                    np.save(f, value)
+                else:
+                    pickle.dump(value, f, pickle.HIGHEST_PROTOCOL)
+            os.replace(temp, path)
+        except Exception as error:
+            print("cached object {} could not be written to disk: {}".format(key, error))
+            if os.path.exists(temp):
+                os.remove(temp)
+            return False
+        self._record(key, path)
+        return True
+
+    def _load(self, key, path):
+        """load an entry back from disk into memory, arrays are memory-mapped copy-on-write"""
+        if path.endswith('.npy'):
+            value = np.load(path, mmap_mode='c')
+        else:
+            with open(path, 'rb') as f:
+                value = pickle.load(f)
+        self._store(key, value)
+        return value
@@ -15,6 +15,8 @@ from System.Net.WebSockets import WebSocketState
 from System.Text import Encoding
 from System.Threading import CancellationTokenSource
 
+from .serialization import Codec
+
 
 SEND_CHUNK_SIZE = 1024
 RECEIVE_CHUNK_SIZE = 1024
@@ -48,6 +50,7 @@ class Client_Net():
         self.socket = ClientWebSocket()
         task = self.socket.ConnectAsync(uri, self.token)
         task.Wait()
+        self.codec = Codec()
         print('connected to cloud using .NET client!')
 
     def disconnect(self):
@@ -1,9 +1,51 @@
 import asyncio
 import websockets
+from websockets.extensions.base import Extension
+from websockets.extensions.permessage_deflate import ClientPerMessageDeflateFactory
+
+from .serialization import Codec
+from .serialization import subprotocols
+from .serialization import COMPRESSION_THRESHOLD
 
 __all__ = ['Client_Websockets']
 
 
+# opcodes of the first frames of text and binary messages
+MESSAGE_OPCODES = (1, 2)
+
+
+class ThresholdDeflate(Extension):
+    """Per-message deflate that sends messages below ``COMPRESSION_THRESHOLD`` uncompressed, like the server does"""
+
+    def __init__(self, deflate):
+        self.deflate = deflate
+        self.name = deflate.name
+
+    def decode(self, frame, *args, **kwargs):
+        return self.deflate.decode(frame, *args, **kwargs)
+
+    def encode(self, frame):
+        if frame.opcode in MESSAGE_OPCODES and frame.fin and len(frame.data) < COMPRESSION_THRESHOLD:
+            # a message without the compressed bit set is valid with per-message deflate negotiated
+            return frame
+        return self.deflate.encode(frame)
+
+
+class ThresholdDeflateFactory(ClientPerMessageDeflateFactory):
+    """Offers per-message deflate with the default settings of websockets, small messages are not compressed"""
+
+    def __init__(self):
+        super().__init__(compress_settings={"memLevel": 5})
+
+    def process_response_params(self, params, accepted_extensions):
+        return ThresholdDeflate(super().process_response_params(params, accepted_extensions))
+
+
+def open_connection(uri):
+    """open a websockets connection offering the codecs of this client and per-message deflate for large messages"""
+    return websockets.connect(uri, max_size=2**30, compression=None, extensions=[ThresholdDeflateFactory()], subprotocols=subprotocols())
+
+
 class Client_Websockets():
     """A Websoket client using webseckts and asyncio that works in a simple synchronous fashion
 
@@ -18,14 +60,31 @@ class Client_Websockets():
         The port number of remote server to connect to.
         Default is ``9000``.
 
+    Notes
+    -----
+    The codec is negotiated during the handshake: faster serializers (msgpack or orjson) and compressions (zstd or lz4)
+    are offered as subprotocols if they are installed, otherwise the server can accept per-message deflate,
+    which the client applies to messages from ``COMPRESSION_THRESHOLD`` on.
+    The negotiated :class:`Codec` is stored in ``codec``.
+
+    The client runs its own event loop, so it keeps working next to asyncio code of the caller and after the default loop
+    was closed. It blocks until every message is sent or received, so it can not be used from within a running event loop,
+    use :class:`AsyncProxy` there instead. The loop is closed by :meth:`disconnect`, or once the client is dropped.
+
     """
 
     def __init__(self, host='127.0.0.1', port=9000):
         """init the client, wait until it successfully connected to server"""
         async def connect():
             uri = "ws://{}:{}".format(host, str(port))
-            self.websocket = await websockets.connect(uri, max_size=2**30)
-        asyncio.get_event_loop().run_until_complete(connect())
+            self.websocket = await open_connection(uri)
+        self.loop = asyncio.new_event_loop()
+        try:
+            self.loop.run_until_complete(connect())
+        except BaseException:
+            self.loop.close()
+            raise
+        self.codec = Codec.from_protocol(self.websocket.subprotocol)
         print('connected to cloud using websockets client!')
 
     def send(self, payload):
@@ -33,10 +92,35 @@ class Client_Websockets():
         async def _send():
             await self.websocket.send(payload)
             return True
-        return asyncio.get_event_loop().run_until_complete(_send())
+        return self.loop.run_until_complete(_send())
 
     def receive(self):
         """listen to a message until received one"""
         async def _receive():
             return await self.websocket.recv()
-        return asyncio.get_event_loop().run_until_complete(_receive())
+        return self.loop.run_until_complete(_receive())
+
+    def disconnect(self):
+        """close the connection to the server and the event loop of the client"""
+        if self.loop.is_closed():
+            return
+        try:
+            self.loop.run_until_complete(self.websocket.close())
+        finally:
+            # the keepalive task of the connection would otherwise be destroyed while pending
+            async def cancel(tasks):
+                for task in tasks:
+                    task.cancel()
+                await asyncio.gather(*tasks, return_exceptions=True)
+            self.loop.run_until_complete(cancel(asyncio.all_tasks(self.loop)))
+            self.loop.close()
+
+    def __del__(self):
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            # only without a running loop in this thread the own loop can run to close the connection
+            try:
+                self.disconnect()
+            except Exception:
+                pass
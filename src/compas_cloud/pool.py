@@ -0,0 +1,227 @@
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import time
+
+from .proxy import Proxy
+from .proxy import ServerSideError
+
+
+__all__ = ['ProxyPool']
+
+
+class Replica(object):
+    """One server of a :class:`ProxyPool` with its connection and health statistics.
+
+    Parameters
+    ----------
+    host : str
+        The host ip of the server.
+    port : int
+        The port number of the server.
+
+    """
+
+    def __init__(self, host, port):
+        self.host = host
+        self.port = port
+        self.proxy = None
+        self.outstanding = 0
+        self.latency = 0.0
+        self.failed_at = None
+        self.generation = 0
+
+    def __repr__(self):
+        return "Replica({}:{}, healthy={}, outstanding={}, latency={:.4f}s)".format(
+            self.host, self.port, self.healthy, self.outstanding, self.latency)
+
+    @property
+    def healthy(self):
+        return self.proxy is not None and self.proxy.client is not None and self.failed_at is None
+
+    def connect(self, **kwargs):
+        """connect to the server, or start it through the proxy if allowed"""
+        try:
+            if self.proxy is None:
+                self.proxy = Proxy(self.host, self.port, **kwargs)
+            else:
+                self.proxy.client = self.proxy.try_reconnect()
+                if not self.proxy.client:
+                    if not kwargs.get('start_server', True):
+                        raise ConnectionError("Failed to connect to {}:{}".format(self.host, self.port))
+                    self.proxy.client = self.proxy.start_server()
+                    if kwargs.get('once', True):
+                        # like the server started when the proxy was created
+                        self.proxy.once()
+        except Exception as error:
+            print("replica {}:{} unavailable: {}".format(self.host, self.port, error))
+            self.fail()
+        else:
+            # requests sent over a previous connection will never be answered
+            self.generation += 1
+            self.failed_at = None
+            self.outstanding = 0
+            self.proxy._replies.clear()
+            self.proxy._streams.clear()
+            self.proxy._done_callbacks.clear()
+
+    def fail(self):
+        """mark the replica as unhealthy"""
+        self.failed_at = time.time()
+
+    def record(self, latency, alpha=0.3):
+        """update the moving average of the call latency"""
+        if self.latency:
+            self.latency = alpha * latency + (1 - alpha) * self.latency
+        else:
+            self.latency = latency
+
+
+class PoolFuture(object):
+    """A handle to a call dispatched by a :class:`ProxyPool`, resubmitted to another replica if its server fails."""
+
+    def __init__(self, pool, package, args, kwargs):
+        self.pool = pool
+        self.package = package
+        self.args = args
+        self.kwargs = kwargs
+        self.submit()
+
+    def submit(self):
+        self.replica, self.future = self.pool.dispatch(self.package, self.args, self.kwargs)
+        self.generation = self.replica.generation
+        self.start = time.time()
+        self.future.add_done_callback(self.received)
+
+    def received(self, future):
+        """update the statistics of the replica as soon as the reply arrives, also if its result is never fetched"""
+        if self.replica.generation == self.generation:
+            self.replica.outstanding -= 1
+            self.replica.record(time.time() - self.start)
+
+    def done(self):
+        return self.future.done()
+
+    def result(self):
+        """wait for the result, failing over to another replica if the connection breaks"""
+        while True:
+            if self.replica.generation != self.generation or self.replica.failed_at is not None:
+                self.submit()
+                continue
+            try:
+                return self.future.result()
+            except ServerSideError:
+                raise
+            except Exception as error:
+                print("replica {}:{} failed: {}".format(self.replica.host, self.replica.port, error))
+                self.replica.fail()
+                self.submit()
+
+
+class ProxyPool(object):
+    """A client for a pool of identical servers that dispatches stateless calls to the least loaded replica.
+
+    Each call goes to the healthy replica with the fewest outstanding calls, ties are broken by the
+    lowest average latency. Replicas whose connection fails are skipped and retried after ``retry_interval``
+    seconds, calls that were running on them are resubmitted to another replica.
+
+    Only stateless functions should be called through a pool: cached data lives on a single server.
+
+    Parameters
+    ----------
+    endpoints : list of tuple
+        The ``(host, port)`` of every replica.
+    retry_interval : float, optional
+        Seconds before an unhealthy replica is reconnected.
+        Default is ``5.0``.
+    kwargs : dict, optional
+        Passed to the :class:`Proxy` of every replica, for example ``start_server=False``.
+
+    Examples
+    --------
+
+    .. code-block:: python
+
+        from compas_cloud import ProxyPool
+        pool = ProxyPool([('127.0.0.1', 9101), ('127.0.0.1', 9102), ('127.0.0.1', 9103)])
+        transform_points_numpy = pool.function('compas.geometry.transform_points_numpy')
+        results = pool.map('compas.geometry.transform_points_numpy', [(pts, T) for pts in batches])
+
+    """
+
+    def __init__(self, endpoints, retry_interval=5.0, **kwargs):
+        self.retry_interval = retry_interval
+        self.options = kwargs
+        self.replicas = [Replica(host, port) for host, port in endpoints]
+        for replica in self.replicas:
+            replica.connect(**self.options)
+        if not any(replica.healthy for replica in self.replicas):
+            raise ConnectionError("None of the replicas is available.")
+
+    def select(self):
+        """select the healthy replica with the fewest outstanding calls and the lowest latency"""
+        now = time.time()
+        for replica in self.replicas:
+            if replica.failed_at is not None and now - replica.failed_at > self.retry_interval:
+                replica.connect(**self.options)
+
+        healthy = [replica for replica in self.replicas if replica.healthy]
+        if not healthy:
+            raise ConnectionError("None of the replicas is available.")
+        return min(healthy, key=lambda replica: (replica.outstanding, replica.latency))
+
+    def dispatch(self, package, args, kwargs):
+        """send a call to the selected replica, trying the next one if sending fails"""
+        while True:
+            replica = self.select()
+            try:
+                future = replica.proxy.submit(package, False, *args, **kwargs)
+            except Exception as error:
+                print("replica {}:{} failed: {}".format(replica.host, replica.port, error))
+                replica.fail()
+            else:
+                replica.outstanding += 1
+                return replica, future
+
+    def submit(self, package, *args, **kwargs):
+        """dispatch a call without waiting and return a future of its result"""
+        return PoolFuture(self, package, args, kwargs)
+
+    def run(self, package, *args, **kwargs):
+        """dispatch a call and wait for its result"""
+        return self.submit(package, *args, **kwargs).result()
+
+    def function(self, package):
+        """returns wrapper of a stateless function that is executed on one of the replicas"""
+        def run_function(*args, **kwargs):
+            return self.run(package, *args, **kwargs)
+
+        def submit_function(*args, **kwargs):
+            return self.submit(package, *args, **kwargs)
+
+        run_function.submit = submit_function
+        return run_function
+
+    def map(self, package, arguments):
+        """call a function for every tuple of arguments, spreading the calls over all replicas"""
+        futures = [self.submit(package, *args) for args in arguments]
+        return [future.result() for future in futures]
+
+    def check(self):
+        """check the connection of every replica"""
+        status = {}
+        for replica in self.replicas:
+            key = "{}:{}".format(replica.host, replica.port)
+            try:
+                status[key] = replica.proxy.check()
+            except Exception as error:
+                replica.fail()
+                status[key] = {'error': str(error)}
+        return status
+
+    def shutdown(self):
+        """shut down the servers of all healthy replicas"""
+        for replica in self.replicas:
+            if replica.healthy:
+                replica.proxy.shutdown()
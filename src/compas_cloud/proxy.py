@@ -2,19 +2,15 @@ from __future__ import absolute_import
 from __future__ import division
 from __future__ import print_function
 
-import json
-
-try:
-    from compas.data import DataEncoder
-    from compas.data import DataDecoder
-except ImportError:
-    from compas.utilities import DataEncoder
-    from compas.utilities import DataDecoder
-
 import compas
 
 import time
 import inspect
+import itertools
+import json
+import socket
+
+from collections import deque
 
 from subprocess import Popen
 from functools import wraps
@@ -25,8 +21,19 @@ if compas.IPY:
 else:
     from .client_websockets import Client_Websockets as Client
 
+from .serialization import content_hash
+from .serialization import loads
+from .serialization import BINARY_SUPPORT
+
+
+__all__ = ['Proxy', 'Callback']
+
 
-__all__ = ['Proxy']
+# data larger than this is only uploaded if the server does not have the same content cached yet
+DEDUP_THRESHOLD = 64 * 1024
+
+# default port of the zygote that forks new servers, see compas_cloud.zygote
+ZYGOTE_PORT = 9008
 
 
 def retry_if_exception(ex, max_retries, wait=0):
@@ -58,6 +65,233 @@ class ServerSideError(Exception):
     pass
 
 
+def parse_callbacks(callbacks, args, kwargs):
+    """replace callback functions in arguments with their references and register them by id"""
+    def parse(cb):
+        if not callable(cb):
+            return cb
+        if not isinstance(cb, Callback):
+            callbacks[id(cb)] = Callback(cb)
+            return {'callback': {'id': id(cb)}}
+        callbacks[id(cb)] = cb
+        return cb.reference()
+
+    args = [parse(a) for a in args]
+    kwargs = {key: parse(value) for key, value in kwargs.items()}
+    return args, kwargs
+
+
+def read_line(connection):
+    """read one newline terminated message from a socket"""
+    message = b''
+    while not message.endswith(b'\n'):
+        chunk = connection.recv(64)
+        if not chunk:
+            break
+        message += chunk
+    return message.decode()
+
+
+def cache_message(data, ttl=None, key=None):
+    """create the message that caches data or a function on the server, data is stored under its content hash if given"""
+    if callable(data):
+        return {'cache_func': {
+            'name': data.__name__,
+            'source': inspect.getsource(data)
+        }}
+    message = {'cache': data}
+    if ttl is not None:
+        message['ttl'] = ttl
+    if key is not None:
+        message['hash'] = key
+    return message
+
+
+class Callback(object):
+    """A client side function called by the server, with a policy that limits how often its arguments are sent.
+
+    Parameters
+    ----------
+    function : callable
+        The function that is called with the arguments sent by the server.
+    rate : float, optional
+        The maximum number of calls per second, calls in between are dropped. Unlimited by default.
+    coalesce : bool, optional
+        Keep only the latest call that could not be sent yet instead of dropping it,
+        so that stale intermediate values are skipped but the last one always arrives.
+        Default is ``False``.
+    delta : bool, optional
+        Send only the rows of array arguments that changed since the previous call.
+        Default is ``False``.
+    tolerance : float, optional
+        Rows of delta encoded arrays that changed less than this are not sent.
+        Default is ``0``.
+    overflow : {'block', 'drop'}, optional
+        Whether the function on the server waits while the client does not keep up with the calls,
+        or the calls are dropped. The default of the server is used if not given, which is ``'block'``.
+
+    Examples
+    --------
+
+    .. code-block:: python
+
+        preview = proxy.callback(update_mesh, rate=10, coalesce=True, delta=True)
+        xyz, q, f, l, r = dr_numpy(vertices, edges, fixed, loads, qpre, fpre, lpre, linit, E, radius, kmax=100, callback=preview)
+
+    """
+
+    def __init__(self, function, rate=None, coalesce=False, delta=False, tolerance=0, overflow=None):
+        self.function = function
+        self.rate = rate
+        self.coalesce = coalesce
+        self.delta = delta
+        self.tolerance = tolerance
+        self.overflow = overflow
+        self.values = {}
+
+    def __call__(self, *args, **kwargs):
+        return self.function(*args, **kwargs)
+
+    def reference(self):
+        """the reference sent to the server in place of the function"""
+        reference = {'id': id(self)}
+        if self.rate:
+            reference['rate'] = self.rate
+        if self.coalesce:
+            reference['coalesce'] = True
+        if self.delta:
+            reference['delta'] = True
+            reference['tolerance'] = self.tolerance
+        if self.overflow:
+            reference['overflow'] = self.overflow
+        return {'callback': reference}
+
+    def receive(self, message):
+        """call the function with the arguments of a callback message, rebuilding delta encoded arrays"""
+        args = list(message['args'])
+        kwargs = dict(message['kwargs'])
+        if self.delta:
+            for i, value in enumerate(args):
+                args[i] = self.expand(i, value, i in message.get('delta', ()))
+            for key, value in kwargs.items():
+                kwargs[key] = self.expand(key, value, key in message.get('delta', ()))
+        return self(*args, **kwargs)
+
+    def expand(self, key, value, changed):
+        """apply changed rows to the previous value of an argument, or remember a value that was sent in full"""
+        if not changed:
+            self.values[key] = value
+            return value
+        previous = self.values[key]
+        if isinstance(previous, list):
+            current = list(previous)
+            for row, item in zip(value['rows'], value['values']):
+                current[row] = item
+        else:
+            current = previous.copy()
+            current[value['rows']] = value['values']
+        self.values[key] = current
+        # the function gets its own copy, changing it must not corrupt the next update
+        return list(current) if isinstance(current, list) else current.copy()
+
+
+class RemoteFuture(object):
+    """A handle to a request that was sent to the server and whose reply may not have arrived yet.
+
+    Parameters
+    ----------
+    proxy : :class:`Proxy`
+        The proxy the request was sent through.
+    request_id : int
+        The id of the request, used to match the reply from the server.
+
+    """
+
+    def __init__(self, proxy, request_id):
+        self.proxy = proxy
+        self.id = request_id
+        self.reply = None
+
+    def done(self):
+        """check if the reply of this request has already been received"""
+        return self.reply is not None or self.id in self.proxy._replies
+
+    def add_done_callback(self, function):
+        """call a function with this future as soon as its reply is received, right away if it was received already"""
+        if self.done():
+            function(self)
+        else:
+            self.proxy._done_callbacks.setdefault(self.id, []).append(function)
+
+    def result(self):
+        """wait for the reply of this request and return its result"""
+        if self.reply is None:
+            self.reply = self.proxy.wait(self.id)
+        if 'error' in self.reply:
+            raise ServerSideError("".join(self.reply['error']))
+        if 'stream' in self.reply:
+            return RemoteIterator(self.proxy, self.id, self.reply['stream'])
+        return self.reply['result']
+
+
+class RemoteIterator(object):
+    """An iterator over the values yielded by a remote generator, streamed from the server as they are produced.
+
+    The server sends at most ``window`` values ahead of what has been consumed,
+    consumed values are acknowledged so that neither side buffers the whole result.
+
+    Parameters
+    ----------
+    proxy : :class:`Proxy`
+        The proxy the stream is received through.
+    stream_id : int
+        The id of the request that started the stream.
+    window : int
+        The number of values the server may send before waiting for an acknowledgement.
+
+    """
+
+    def __init__(self, proxy, stream_id, window):
+        self.proxy = proxy
+        self.id = stream_id
+        self.window = window
+        self.consumed = 0
+        self.finished = False
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if self.finished:
+            raise StopIteration
+        chunks = self.proxy._streams[self.id]
+        while not chunks:
+            self.proxy.receive()
+        message = chunks.popleft()
+
+        if 'chunk' in message:
+            self.consumed += 1
+            if self.consumed >= max(1, self.window // 2):
+                self.proxy.send_only({'ack': self.id, 'count': self.consumed})
+                self.consumed = 0
+            return message['chunk']
+
+        self.finished = True
+        del self.proxy._streams[self.id]
+        if 'error' in message:
+            raise ServerSideError("".join(message['error']))
+        raise StopIteration
+
+    next = __next__
+
+    def close(self):
+        """stop the remote generator before it is exhausted"""
+        if not self.finished:
+            self.finished = True
+            del self.proxy._streams[self.id]
+            self.proxy.send_only({'ack': self.id, 'close': True})
+
+
 class Proxy():
     """Proxy is the interface between the user and a websocket client which communicates to websoket server in background.
 
@@ -66,6 +300,18 @@ class Proxy():
     port : int, optional
         The port number on the remote server.
         Default is ``9009``.
+    binary : bool, optional
+        Send messages as binary frames so that numpy arrays are transferred as raw buffers.
+        Only used if numpy is available on the client side.
+        Default is ``True``.
+    timeout : float, optional
+        Seconds to wait for a started server to be ready.
+        Default is ``30``.
+    zygote : int or bool, optional
+        The port of a running zygote (``python -m compas_cloud.zygote``) that forks new servers
+        with all modules already imported, ``True`` for the default port.
+        A new process is started if there is no zygote.
+        Default is ``None``.
 
     Notes
     -----
@@ -92,12 +338,21 @@ class Proxy():
 
     """
 
-    def __init__(self, host='127.0.0.1', port=9009, background=True, errorHandler=None, once=True, start_server=True):
+    def __init__(self, host='127.0.0.1', port=9009, background=True, errorHandler=None, once=True, start_server=True, binary=True, timeout=30, zygote=None):
         """init function that starts a remote server then assigns corresponding client(websockets/.net) to the proxy"""
         self._python = compas._os.select_python(None)
+        self._ids = itertools.count()
+        self._replies = {}
+        self._streams = {}
+        self._done_callbacks = {}
+        self.callbacks = {}
         self.host = host
         self.port = port
         self.background = background
+        self.timeout = timeout
+        self.zygote = ZYGOTE_PORT if zygote is True else zygote
+        self._process = None
+        self.binary = binary and BINARY_SUPPORT and not compas.IPY
         self.client = self.try_reconnect()
         if not self.client:
             if start_server:
@@ -110,14 +365,20 @@ class Proxy():
             else:
                 raise ConnectionError("Failed to connect to {}:{}".format(host, port))
 
-        self.callbacks = {}
         self.errorHandler = errorHandler
 
     def package(self, function, cache=False):
         raise RuntimeError("Proxy.package() has been deprecated, please use Proxy.function() instead.")
 
-    def function(self, package, cache=False):
-        """returns wrapper of function that will be executed on server side"""
+    def function(self, package, cache=False, memoize=False):
+        """returns wrapper of function that will be executed on server side
+
+        The wrapper blocks until the result is returned. Its ``submit`` attribute sends the call
+        without waiting and returns a :class:`RemoteFuture`, so that several calls can be in flight at once.
+        If the remote function returns a generator, the wrapper returns a :class:`RemoteIterator` instead.
+        With ``memoize``, the server returns the stored result of an earlier call with the same arguments,
+        which is only correct for pure functions.
+        """
 
         if callable(package):
             package = self.cache(package)
@@ -126,15 +387,18 @@ class Proxy():
             @self.errorHandler
             @retry_if_exception(Exception, 5, wait=0.5)
             def run_function(*args, **kwargs):
-                return self.run(package, cache, *args, **kwargs)
+                return self.call(package, cache, args, kwargs, memoize).result()
 
-            return run_function
         else:
             @retry_if_exception(Exception, 5, wait=0.5)
             def run_function(*args, **kwargs):
-                return self.run(package, cache, *args, **kwargs)
+                return self.call(package, cache, args, kwargs, memoize).result()
 
-            return run_function
+        def submit_function(*args, **kwargs):
+            return self.call(package, cache, args, kwargs, memoize)
+
+        run_function.submit = submit_function
+        return run_function
 
     def send(self, data):
         """encode given data before sending to remote server then parse returned result"""
@@ -142,44 +406,66 @@ class Proxy():
             print("There is no connected client, try to restart proxy")
             return
 
-        istring = json.dumps(data, cls=DataEncoder)
-        self.client.send(istring)
-
-        def listen_and_parse():
-            result = self.client.receive()
-            return json.loads(result, cls=DataDecoder)
-
-        result = listen_and_parse()
-        # keep receiving response until a non-callback result is returned
-        while True:
-            if isinstance(result, dict):
-                if 'callback' in result:
-                    cb = result['callback']
-                    self.callbacks[cb['id']](*cb['args'], **cb['kwargs'])
-                    result = listen_and_parse()
-                elif 'listen' in result:
-                    print(*result['listen'])
-                    result = listen_and_parse()
-                else:
-                    break
-            else:
-                break
-
-        return result
+        return self.request(data).result()
+
+    def request(self, data):
+        """send data tagged with a new request id without waiting for the reply"""
+        request_id = next(self._ids)
+        data['id'] = request_id
+        self.client.send(self.encode(data))
+        return RemoteFuture(self, request_id)
+
+    def wait(self, request_id):
+        """receive messages until the reply of given request arrives, dispatching callbacks and replies of other requests on the way"""
+        while request_id not in self._replies:
+            self.receive()
+        return self._replies.pop(request_id)
+
+    def receive(self):
+        """receive and dispatch one message from the server"""
+        self.dispatch(loads(self.client.receive()))
+
+    def dispatch(self, message):
+        """handle one message received from the server"""
+        if 'callback' in message:
+            cb = message['callback']
+            self.callbacks[cb['id']].receive(cb)
+        elif 'listen' in message:
+            print(*message['listen'])
+        elif 'id' not in message:
+            # values of a remote generator, dropped if the iterator was closed already
+            if message['stream'] in self._streams:
+                self._streams[message['stream']].append(message)
+        else:
+            if 'stream' in message:
+                self._streams[message['id']] = deque()
+            self._replies[message['id']] = message
+            for function in self._done_callbacks.pop(message['id'], ()):
+                function(RemoteFuture(self, message['id']))
 
     def send_only(self, data):
-        istring = json.dumps(data, cls=DataEncoder)
-        return self.client.send(istring)
+        return self.client.send(self.encode(data))
+
+    def encode(self, data):
+        """encode data with the codec negotiated by the client, ndarrays are sent as binary frames if supported"""
+        return self.client.codec.encode(data, binary=self.binary)
 
     def run(self, package, cache, *args, **kwargs):
         """pass the arguments to remote function and wait to receive the results"""
-        args, kwargs = self.parse_callbacks(args, kwargs)
+        return self.submit(package, cache, *args, **kwargs).result()
+
+    def submit(self, package, cache, *args, **kwargs):
+        """pass the arguments to remote function and return a future of its results"""
+        return self.call(package, cache, args, kwargs)
+
+    def call(self, package, cache, args, kwargs, memoize=False):
+        """send a call of a remote function and return a future of its results"""
+        args, kwargs = self.parse_callbacks(list(args), kwargs)
         idict = {'package': package, 'cache': cache,
                  'args': args, 'kwargs': kwargs}
-        result = self.send(idict)
-        if isinstance(result, dict) and 'error' in result:
-            raise ServerSideError("".join(result['error']))
-        return result
+        if memoize:
+            idict['memoize'] = True
+        return self.request(idict)
 
     def Sessions(self, *args, **kwargs):
         return Sessions_client(self, *args, **kwargs)
@@ -194,30 +480,36 @@ class Proxy():
         idict = {'get': cached_object['cached']}
         return self.send(idict)
 
-    def cache(self, data):
-        """cache data or function to remote server and return a reference of it"""
+    def cache(self, data, ttl=None):
+        """cache data or function to remote server and return a reference of it, data expires after ``ttl`` seconds if given
+
+        Data is cached under the hash of its content, so identical data is stored once on the server.
+        Large data is only uploaded if the server does not have it yet.
+        """
         if callable(data):
-            idict = {'cache_func': {
-                'name': data.__name__,
-                'source': inspect.getsource(data)
-            }}
-        else:
-            idict = {'cache': data}
-        return self.send(idict)
+            return self.send(cache_message(data))
+        key, size = content_hash(data)
+        if size >= DEDUP_THRESHOLD:
+            cached = self.send({'has': key, 'ttl': ttl})
+            if cached:
+                return cached
+        return self.send(cache_message(data, ttl, key))
+
+    def batch(self):
+        """start a :class:`Batch` of operations that are sent to the server in a single request"""
+        return Batch(self)
+
+    def pipeline(self):
+        """start a :class:`Pipeline` of functions that are chained on the server side"""
+        return Pipeline(self)
+
+    def callback(self, function, rate=None, coalesce=False, delta=False, tolerance=0, overflow=None):
+        """wrap a callback function with a policy that limits how often the server sends its arguments, see :class:`Callback`"""
+        return Callback(function, rate, coalesce, delta, tolerance, overflow)
 
     def parse_callbacks(self, args, kwargs):
         """replace a callback functions with its cached reference then sending it to server"""
-        for i, a in enumerate(args):
-            cb = a
-            if callable(cb):
-                args[i] = {'callback': {'id': id(cb)}}
-                self.callbacks[id(cb)] = cb
-        for key in kwargs:
-            cb = kwargs[key]
-            if callable(cb):
-                kwargs[key] = {'callback': {'id': id(cb)}}
-                self.callbacks[id(cb)] = cb
-        return args, kwargs
+        return parse_callbacks(self.callbacks, args, kwargs)
 
     def try_reconnect(self):
         """try to reconnect to a existing server"""
@@ -230,51 +522,77 @@ class Proxy():
         return client
 
     def start_server(self):
-        """use Popen to start a remote server in background"""
+        """use Popen to start a remote server in background and wait until it reports to be ready
+
+        The server connects back to a socket of the proxy once it is listening and sends its port,
+        so that a port of ``0`` lets the server pick a free one.
+        """
         env = compas._os.prepare_environment()
 
-        args = [self._python, '-m', 'compas_cloud.server', '--port', str(self.port)]
+        listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        listener.bind(('127.0.0.1', 0))
+        listener.listen(1)
 
-        if self.background:
+        ready_port = listener.getsockname()[1]
+        args = [self._python, '-m', 'compas_cloud.server', '--port', str(self.port), '--ready-port', str(ready_port)]
+
+        if self.zygote and self.fork_server(ready_port):
+            print("Forked new cloud server from zygote at {}:{}".format(self.host, self.port))
+        elif self.background:
             print("Starting new cloud server in background at {}:{}".format(self.host, self.port))
             self._process = Popen(args, env=env)
         else:
             print("Starting new cloud server with prompt console at {}:{}".format(self.host, self.port))
             args[0] = compas._os.select_python('python')
             self._process = Popen(args, env=env)
-        # import sys
-        # self._process = Popen(args, stdout=sys.stdout, stderr=sys.stderr, env=env)
+        try:
+            self.port = self.wait_ready(listener)
+        finally:
+            listener.close()
 
-        success = False
-        count = 20
-        while count:
+        client = Client(self.host, self.port)
+        print("server started with port", self.port)
+        return client
+
+    def wait_ready(self, listener):
+        """wait for the started server to connect to the listener and return the port it reports"""
+        listener.settimeout(0.1)
+        deadline = time.time() + self.timeout
+        while True:
             if compas.IPY:
                 Rhino.RhinoApp.Wait()
             try:
-                time.sleep(0.2)
-                client = Client(self.host, self.port)
-            except Exception as e:
-
-                if self._process.poll() is not None:
-                    out, err = self._process.communicate()
-                    if out:
-                        print(out.decode())
-                    if err:
-                        raise RuntimeError(err.decode())
-                    raise RuntimeError('subprocess terminated, reason unknown')
-
-                count -= 1
-                print(e)
-                print("\n\n    {} attempts left.".format(count))
+                connection, _ = listener.accept()
+            except socket.timeout:
+                if self._process is not None and self._process.poll() is not None:
+                    raise RuntimeError("The server terminated with exit code {}.".format(self._process.returncode))
+                if time.time() > deadline:
+                    raise RuntimeError("The server was not ready within {} seconds.".format(self.timeout))
             else:
-                success = True
                 break
-        if not success:
-            raise RuntimeError("The server is not available.")
-        else:
-            print("server started with port", self.port)
 
-        return client
+        connection.settimeout(self.timeout)
+        try:
+            return int(read_line(connection).strip())
+        finally:
+            connection.close()
+
+    def fork_server(self, ready_port):
+        """ask the zygote to fork a new server that reports to the ready port, returns False if there is no zygote"""
+        try:
+            connection = socket.create_connection(('127.0.0.1', self.zygote), self.timeout)
+        except socket.error:
+            print("No zygote at port {}, starting a new process".format(self.zygote))
+            return False
+        try:
+            request = {'port': int(self.port), 'ready_port': ready_port}
+            connection.sendall((json.dumps(request) + '\n').encode())
+            reply = json.loads(read_line(connection))
+        finally:
+            connection.close()
+        self._process = None
+        self._pid = reply['pid']
+        return True
 
     def restart(self):
         """shut down and restart existing server and given ip and port"""
@@ -296,11 +614,169 @@ class Proxy():
         """check if server connection is good"""
         return self.send({'control': 'check'})
 
+    def stats(self):
+        """get the statistics of the server cache and of memoized results"""
+        return self.send({'control': 'stats'})
+
     def once(self):
         """Set the server to close once this client disconnet"""
         return self.send({'control': 'once'})
 
 
+class Batch(object):
+    """A collection of function calls, cache and get operations that are sent to the server in one round trip.
+
+    Every operation returns a reference ``{'batched': index}`` which can be used as argument
+    of later operations in the same batch. The server runs the operations in order and
+    returns all their results together once the batch is sent.
+
+    Parameters
+    ----------
+    proxy : :class:`Proxy`
+        The proxy to send the batch through.
+
+    Examples
+    --------
+
+    .. code-block:: python
+
+        with proxy.batch() as batch:
+            transform_points_numpy = batch.function('compas.geometry.transform_points_numpy')
+            pts = batch.cache([[0, 0, 0], [1, 0, 0]])
+            moved = transform_points_numpy(pts, T)
+
+        print(batch.result(moved))
+
+    """
+
+    def __init__(self, proxy):
+        self.proxy = proxy
+        self.operations = []
+        self.results = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.send()
+
+    def add(self, data):
+        """add an operation to the batch and return a reference to its result"""
+        self.operations.append(data)
+        return {'batched': len(self.operations) - 1}
+
+    def function(self, package, cache=False, memoize=False):
+        """returns wrapper of function whose calls are added to the batch"""
+        def run_function(*args, **kwargs):
+            args, kwargs = self.proxy.parse_callbacks(list(args), kwargs)
+            operation = {'package': package, 'cache': cache, 'args': args, 'kwargs': kwargs}
+            if memoize:
+                operation['memoize'] = True
+            return self.add(operation)
+        return run_function
+
+    def cache(self, data, ttl=None):
+        """add caching of data or function to the batch"""
+        return self.add(cache_message(data, ttl))
+
+    def get(self, reference):
+        """add fetching of a cached object or of a result cached earlier in the batch"""
+        if 'cached' in reference:
+            reference = reference['cached']
+        return self.add({'get': reference})
+
+    def send(self):
+        """send all collected operations and store their results"""
+        self.results = self.proxy.send({'batch': self.operations})
+        return self.results
+
+    def result(self, reference):
+        """get the result of an operation from its reference"""
+        if self.results is None:
+            raise RuntimeError("The batch has not been sent yet.")
+        return self.results[reference['batched']]
+
+
+class Pipeline(object):
+    """A chain of functions that is submitted once and executed entirely on the server.
+
+    Each step receives the output of the previous step, at the position marked by ``Pipeline.PREVIOUS``
+    or as first positional argument if the step has no such marker. Other arguments can be constants
+    or cached references. Only the final result, or a reference to it, is sent back.
+
+    Parameters
+    ----------
+    proxy : :class:`Proxy`
+        The proxy to send the pipeline through.
+
+    Examples
+    --------
+
+    .. code-block:: python
+
+        pipeline = proxy.pipeline()
+        pipeline.add('compas.geometry.transform_points_numpy', Pipeline.PREVIOUS, T)
+        pts = pipeline.run(proxy.cache(pts), repeat=100)
+
+    """
+
+    PREVIOUS = {'previous': True}
+
+    def __init__(self, proxy):
+        self.proxy = proxy
+        self.steps = []
+
+    def add(self, package, *args, **kwargs):
+        """add a function step to the end of the pipeline"""
+        args, kwargs = self.proxy.parse_callbacks(list(args), kwargs)
+        self.steps.append({'package': package, 'args': args, 'kwargs': kwargs})
+        return self
+
+    def run(self, data, repeat=1, cache=False):
+        """run the pipeline on given input, or on a cached reference, repeating all steps ``repeat`` times"""
+        idict = {'pipeline': {'steps': self.steps, 'input': data, 'repeat': repeat, 'cache': cache}}
+        return self.proxy.send(idict)
+
+
+class RemoteTask(object):
+    """A handle to the result of a task added to a remote :class:`Sessions` through :class:`Proxy`.
+
+    Parameters
+    ----------
+    sessions : :class:`Sessions_client`
+        The client of the remote session.
+    task_id : int
+        The id of the task.
+
+    """
+
+    def __init__(self, sessions, task_id):
+        self.sessions = sessions
+        self.id = task_id
+        self.fetched = None
+        self.value = None
+
+    def __repr__(self):
+        return "RemoteTask(task-{})".format(self.id)
+
+    def result(self, cache=False):
+        """wait for the task and return its result, or a reference to the result cached on the server
+
+        The session hands out a result only once, later calls get it from the first one.
+        """
+        proxy = self.sessions.proxy
+        if self.fetched is None:
+            idict = {'sessions': {'command': 'result', 'task': self.id, 'cache': cache, 'args': (), 'kwargs': {}}}
+            self.value = proxy.send(idict)
+            self.fetched = cache
+        if self.fetched == cache:
+            return self.value
+        if cache:
+            return proxy.cache(self.value)
+        return proxy.get(self.value)
+
+
 class Sessions_client():
 
     def __init__(self, proxy, *args, **kwargs):
@@ -313,16 +789,31 @@ class Sessions_client():
         print(self.proxy.send(idict))
 
     def add_task(self, func, *args, **kwargs):
+        """add a task to the remote session and return a :class:`RemoteTask` of its result"""
+        return self.submit(func, args, kwargs)
+
+    def submit(self, func, args=(), kwargs=None, timeout=None, retries=None):
+        """add a task with its own timeout and number of retries to the remote session, see :meth:`Sessions.submit`"""
         cached = self.proxy.cache(func)
-        idict = {'sessions': {'command': 'add_task', 'func': cached, 'args': args, 'kwargs': kwargs}}
-        print(self.proxy.send(idict))
+        idict = {'sessions': {'command': 'add_task', 'func': cached, 'args': args, 'kwargs': kwargs or {},
+                              'timeout': timeout, 'retries': retries}}
+        task = RemoteTask(self, self.proxy.send(idict)['task'])
+        print("task-{} added".format(task.id))
+        return task
 
     def listen(self):
         idict = {'sessions': {'command': 'listen', 'args': (), 'kwargs': {}}}
         print(self.proxy.send(idict))
 
+    def close(self):
+        """let the workers exit once the tasks added so far are done"""
+        idict = {'sessions': {'command': 'close', 'args': (), 'kwargs': {}}}
+        print(self.proxy.send(idict))
+
     def terminate(self):
-        pass
+        """stop the workers right away, also the tasks that are running"""
+        idict = {'sessions': {'command': 'shutdown', 'args': (), 'kwargs': {}}}
+        print(self.proxy.send(idict))
 
 
 if __name__ == "__main__":
@@ -0,0 +1,408 @@
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import hashlib
+import json
+import struct
+
+try:
+    from compas.data import Data
+    from compas.data import DataEncoder
+    from compas.data import DataDecoder
+except ImportError:
+    from compas.base import Base as Data
+    from compas.utilities import DataEncoder
+    from compas.utilities import DataDecoder
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+try:
+    import lz4.frame
+except ImportError:
+    lz4 = None
+
+
+__all__ = ['Codec', 'dumps', 'loads', 'dumps_binary', 'loads_binary', 'dumps_msgpack', 'dumps_orjson', 'compress', 'content_hash',
+           'subprotocols', 'select_protocol', 'BINARY_SUPPORT', 'COMPRESSION_THRESHOLD']
+
+
+BINARY_SUPPORT = np is not None
+
+# every binary message starts with a one byte tag describing its layout
+ARRAYS = b'\x01'
+ZSTD = b'\x02'
+LZ4 = b'\x03'
+MSGPACK = b'\x04'
+ORJSON_ARRAYS = b'\x05'
+
+# msgpack extension types
+NDARRAY_EXT = 1
+DATA_EXT = 2
+
+# messages smaller than this are never compressed
+COMPRESSION_THRESHOLD = 4096
+
+# available compression codecs in order of preference, as name: (tag, compress, decompress)
+COMPRESSORS = {}
+if zstandard is not None:
+    COMPRESSORS['zstd'] = (ZSTD, lambda data: zstandard.ZstdCompressor(level=3).compress(data), lambda data: zstandard.ZstdDecompressor().decompress(data))
+if lz4 is not None:
+    COMPRESSORS['lz4'] = (LZ4, lz4.frame.compress, lz4.frame.decompress)
+COMPRESSIONS = [name for name in ('zstd', 'lz4') if name in COMPRESSORS]
+DECOMPRESSORS = {tag: decompress for tag, _, decompress in COMPRESSORS.values()}
+
+# available serializers in order of preference, plain JSON is always available
+SERIALIZERS = [name for name, module in (('msgpack', msgpack), ('orjson', orjson)) if module is not None] + ['json']
+
+SUBPROTOCOL = 'compas_cloud.{}'
+
+HEADER = struct.Struct('!I')
+ALIGNMENT = 8
+
+# dtype kinds that can be shipped as raw buffers: bool, int, uint, float, complex
+NUMERIC_KINDS = 'biufc'
+
+
+def _align(offset):
+    return (offset + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
+
+
+def _is_numeric_array(o):
+    return np is not None and isinstance(o, np.ndarray) and o.dtype.kind in NUMERIC_KINDS
+
+
+def _contiguous(array):
+    if not array.flags.c_contiguous:
+        return array.copy(order='C')
+    return array
+
+
+class ArrayBuffers(object):
+    """The raw buffers of the ndarrays taken out of a message header"""
+
+    def __init__(self):
+        self.arrays = []
+        self.size = 0
+
+    def add(self, array):
+        """add an array and return the placeholder that replaces it in the header"""
+        array = _contiguous(array)
+        offset = _align(self.size)
+        self.arrays.append((offset, array))
+        self.size = offset + array.nbytes
+        return {'__ndarray__': offset, 'dtype': array.dtype.str, 'shape': array.shape}
+
+
+def _load_array(o, buffer):
+    dtype = np.dtype(o['dtype'])
+    count = int(np.prod(o['shape']))
+    array = np.frombuffer(buffer, dtype, count, o['__ndarray__'])
+    return array.reshape(o['shape'])
+
+
+class ArrayEncoder(DataEncoder):
+    """A DataEncoder that takes the buffers of numeric ndarrays out of the JSON text
+
+    Each array is replaced by a small placeholder
+    ``{'__ndarray__': offset, 'dtype': ..., 'shape': ...}``
+    and its raw bytes are collected in ``buffers`` to be sent next to the header.
+    """
+
+    def __init__(self, *args, **kwargs):
+        self.buffers = kwargs.pop('buffers')
+        super(ArrayEncoder, self).__init__(*args, **kwargs)
+
+    def default(self, o):
+        if _is_numeric_array(o):
+            return self.buffers.add(o)
+        return super(ArrayEncoder, self).default(o)
+
+
+class ArrayDecoder(DataDecoder):
+    """A DataDecoder that rebuilds ndarrays from the buffers following the JSON header"""
+
+    def __init__(self, *args, **kwargs):
+        self.buffer = kwargs.pop('buffer')
+        super(ArrayDecoder, self).__init__(*args, **kwargs)
+
+    def object_hook(self, o):
+        if '__ndarray__' in o:
+            return _load_array(o, self.buffer)
+        return super(ArrayDecoder, self).object_hook(o)
+
+
+class Codec(object):
+    """The encoding of the messages on one connection, as negotiated when connecting.
+
+    Any message can be decoded regardless of the codec, since binary messages are tagged with their layout.
+
+    Parameters
+    ----------
+    serializer : {'json', 'orjson', 'msgpack'}, optional
+        The serializer of outgoing messages.
+        Default is ``'json'``.
+    compression : {None, 'zstd', 'lz4'}, optional
+        The codec compressing outgoing messages above ``COMPRESSION_THRESHOLD``.
+        Default is ``None``.
+
+    """
+
+    def __init__(self, serializer='json', compression=None):
+        self.serializer = serializer
+        self.compression = compression
+
+    def __repr__(self):
+        return "Codec({!r}, {!r})".format(self.serializer, self.compression)
+
+    @property
+    def protocol(self):
+        """the websocket subprotocol selecting this codec"""
+        if self.compression:
+            return SUBPROTOCOL.format('{}.{}'.format(self.serializer, self.compression))
+        return SUBPROTOCOL.format(self.serializer)
+
+    @classmethod
+    def from_protocol(cls, protocol):
+        """create the codec selected by a websocket subprotocol, plain JSON if there is none"""
+        if not protocol or not protocol.startswith(SUBPROTOCOL.format('')):
+            return cls()
+        names = protocol.split('.')[1:]
+        return cls(names[0], names[1] if len(names) > 1 else None)
+
+    def encode(self, data, binary=True):
+        """encode data to a message, which is text only for the JSON serializer without binary frames
+
+        Messages with integers wider than 64 bits fall back to JSON, which msgpack and orjson can not encode.
+
+        Parameters
+        ----------
+        data : object
+            The data to encode.
+        binary : bool, optional
+            If the JSON serializer is used, send ndarrays as raw buffers next to a JSON header.
+            Default is ``True``.
+
+        """
+        payload = None
+        try:
+            if self.serializer == 'msgpack':
+                payload = dumps_msgpack(data)
+            elif self.serializer == 'orjson':
+                payload = dumps_orjson(data)
+        except (OverflowError, TypeError):
+            # integers wider than 64 bits only fit in JSON, objects that can not be encoded at all fail there again
+            pass
+        if payload is None:
+            payload = dumps_binary(data) if binary and BINARY_SUPPORT else dumps(data)
+        if self.compression and len(payload) >= COMPRESSION_THRESHOLD:
+            return compress(payload, self.compression)
+        return payload
+
+    def decode(self, payload):
+        """decode a received message"""
+        return loads(payload)
+
+
+def dumps(data):
+    """encode data to a JSON string"""
+    return json.dumps(data, cls=DataEncoder)
+
+
+def loads(payload):
+    """decode a message received as text, as binary frames or compressed"""
+    if isinstance(payload, (bytes, bytearray)):
+        tag = payload[:1]
+        if tag in DECOMPRESSORS:
+            payload = DECOMPRESSORS[tag](memoryview(payload)[1:])
+            tag = payload[:1]
+        if tag == ARRAYS:
+            return loads_binary(payload)
+        if tag == MSGPACK:
+            return loads_msgpack(payload)
+        if tag == ORJSON_ARRAYS:
+            return loads_orjson(payload)
+    return json.loads(payload, cls=DataDecoder)
+
+
+def _pack_arrays(tag, header, buffers):
+    frames = [tag, HEADER.pack(len(header)), header]
+    position = len(tag) + HEADER.size + len(header)
+    start = _align(position)
+    for offset, array in buffers.arrays:
+        padding = start + offset - position
+        if padding:
+            frames.append(b'\x00' * padding)
+        frames.append(array.data)
+        position = start + offset + array.nbytes
+    return b''.join(frames)
+
+
+def _unpack_arrays(payload):
+    payload = bytearray(payload)
+    begin = 1 + HEADER.size
+    size, = HEADER.unpack_from(payload, 1)
+    header = bytes(payload[begin:begin + size])
+    buffer = memoryview(payload)[_align(begin + size):]
+    return header, buffer
+
+
+def dumps_binary(data):
+    """encode data to a binary message: a JSON header followed by the raw buffers of its ndarrays
+
+    The layout is ``tag | header length | JSON header | aligned array buffers``,
+    so that no array is ever converted to nested lists of numbers.
+    """
+    buffers = ArrayBuffers()
+    header = json.dumps(data, cls=ArrayEncoder, buffers=buffers).encode('utf-8')
+    return _pack_arrays(ARRAYS, header, buffers)
+
+
+def loads_binary(payload):
+    """decode a binary message created by ``dumps_binary``
+
+    The payload is copied once into a writable buffer which the decoded ndarrays share.
+    """
+    header, buffer = _unpack_arrays(payload)
+    return json.loads(header.decode('utf-8'), cls=ArrayDecoder, buffer=buffer)
+
+
+def dumps_orjson(data):
+    """encode data with orjson to the same layout as ``dumps_binary``"""
+    buffers = ArrayBuffers()
+    encoder = DataEncoder()
+
+    def default(o):
+        if _is_numeric_array(o):
+            return buffers.add(o)
+        return encoder.default(o)
+
+    header = orjson.dumps(data, default=default, option=orjson.OPT_NON_STR_KEYS)
+    return _pack_arrays(ORJSON_ARRAYS, header, buffers)
+
+
+def loads_orjson(payload):
+    """decode a message created by ``dumps_orjson``"""
+    header, buffer = _unpack_arrays(payload)
+    decoder = DataDecoder()
+
+    # orjson has no object hook, the placeholders and COMPAS data are rebuilt bottom up
+    def rebuild(o):
+        if isinstance(o, dict):
+            for key, value in o.items():
+                if isinstance(value, (dict, list)):
+                    o[key] = rebuild(value)
+            if '__ndarray__' in o:
+                return _load_array(o, buffer)
+            return decoder.object_hook(o)
+        for i, value in enumerate(o):
+            if isinstance(value, (dict, list)):
+                o[i] = rebuild(value)
+        return o
+
+    data = orjson.loads(header)
+    if isinstance(data, (dict, list)):
+        return rebuild(data)
+    return data
+
+
+def _msgpack_default(o):
+    if _is_numeric_array(o):
+        o = _contiguous(o)
+        header = msgpack.packb([o.dtype.str, o.shape])
+        return msgpack.ExtType(NDARRAY_EXT, header + o.tobytes())
+    if isinstance(o, Data):
+        return msgpack.ExtType(DATA_EXT, msgpack.packb(DataEncoder().default(o), default=_msgpack_default, use_bin_type=True))
+    return DataEncoder().default(o)
+
+
+def _msgpack_ext_hook(code, data):
+    if code == NDARRAY_EXT:
+        unpacker = msgpack.Unpacker()
+        unpacker.feed(data)
+        dtype, shape = unpacker.unpack()
+        buffer = bytearray(memoryview(data)[unpacker.tell():])
+        return np.frombuffer(buffer, np.dtype(dtype)).reshape(shape)
+    if code == DATA_EXT:
+        return DataDecoder().object_hook(_unpackb(data))
+    return msgpack.ExtType(code, data)
+
+
+def _unpackb(data):
+    return msgpack.unpackb(data, ext_hook=_msgpack_ext_hook, raw=False, strict_map_key=False)
+
+
+def dumps_msgpack(data):
+    """encode data with msgpack, ndarrays and COMPAS data objects are packed as extension types"""
+    return MSGPACK + msgpack.packb(data, default=_msgpack_default, use_bin_type=True)
+
+
+def loads_msgpack(payload):
+    """decode a message created by ``dumps_msgpack``"""
+    return _unpackb(memoryview(payload)[1:])
+
+
+def content_hash(data):
+    """hash the content of data, returns the hex digest and the size of the hashed content in bytes
+
+    The buffers of numeric ndarrays are hashed directly, everything else through its JSON encoding.
+    Keys of dictionaries are sorted, so that their order does not matter, unless they can not be compared.
+    """
+    try:
+        return _content_hash(data, True)
+    except TypeError:
+        return _content_hash(data, False)
+
+
+def _content_hash(data, sort_keys):
+    digest = hashlib.sha256()
+    if BINARY_SUPPORT:
+        buffers = ArrayBuffers()
+        header = json.dumps(data, cls=ArrayEncoder, buffers=buffers, sort_keys=sort_keys).encode('utf-8')
+        digest.update(header)
+        for _, array in buffers.arrays:
+            digest.update(array.data)
+        return digest.hexdigest(), len(header) + buffers.size
+    header = json.dumps(data, cls=DataEncoder, sort_keys=sort_keys).encode('utf-8')
+    digest.update(header)
+    return digest.hexdigest(), len(header)
+
+
+def compress(payload, codec):
+    """compress an encoded message with given codec, the result is always sent as binary message"""
+    if not isinstance(payload, bytes):
+        payload = payload.encode('utf-8')
+    tag, compressor, _ = COMPRESSORS[codec]
+    return tag + compressor(payload)
+
+
+def subprotocols():
+    """the websocket subprotocols a client offers to negotiate its codec, in order of preference"""
+    return [Codec(serializer, compression).protocol for serializer in SERIALIZERS for compression in COMPRESSIONS + [None]]
+
+
+def select_protocol(protocols):
+    """select the first offered subprotocol whose codec is available, returns the protocol and the :class:`Codec`"""
+    available = subprotocols()
+    for protocol in protocols:
+        if protocol in available:
+            return protocol, Codec.from_protocol(protocol)
+    return None, Codec()
@@ -1,109 +1,657 @@
 from autobahn.asyncio.websocket import WebSocketServerProtocol
+from autobahn.websocket.compress import PerMessageDeflateOffer
+from autobahn.websocket.compress import PerMessageDeflateOfferAccept
 
 import compas
+import copy
 import importlib
 import json
 from compas_cloud import Sessions
+from compas_cloud.sessions import SourceFunction
+from compas_cloud.cache import Cache
+from compas_cloud.serialization import content_hash
+from compas_cloud.serialization import dumps
+from compas_cloud.serialization import loads
+from compas_cloud.serialization import select_protocol
+from compas_cloud.serialization import Codec
+from compas_cloud.serialization import COMPRESSION_THRESHOLD
+import os
 import time
+import signal
+import socket
 import sys
+import threading
 import traceback
+import inspect
+import asyncio
 import pkg_resources
+from collections.abc import Iterator
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures import ThreadPoolExecutor
 
 try:
-    from compas.data import DataEncoder
-    from compas.data import DataDecoder
+    import numpy as np
 except ImportError:
-    from compas.utilities import DataEncoder
-    from compas.utilities import DataDecoder
+    np = None
+
+
+# number of values a generator may stream ahead of the client's acknowledgements
+STREAM_WINDOW = 16
+
+# number of callback messages that may wait to be sent before callers block or their messages are dropped
+CALLBACK_BUFFER = 64
+
+# marks a call without memoized result
+MISSING = object()
+
+# functions resolved from their full name
+FUNCTIONS = {}
+
+# options of the server command that take several values
+LIST_OPTIONS = ('preload', 'memoize')
+
+# length of the hex digests of content hashes, unique keys of cached data are shorter
+HASH_LENGTH = 64
+
+
+def accept_deflate(offers):
+    """accept per-message deflate if the client offers it"""
+    for offer in offers:
+        if isinstance(offer, PerMessageDeflateOffer):
+            return PerMessageDeflateOfferAccept(offer)
+
+
+def decline_deflate(offers):
+    """decline all per-message compression offers"""
+    return None
+
+
+def import_function(package):
+    """import a function from its full name, like ``compas.geometry.transform_points_numpy``, resolved functions are kept"""
+    try:
+        return FUNCTIONS[package]
+    except KeyError:
+        names = package.split('.')
+        module = importlib.import_module('.'.join(names[:-1]))
+        function = FUNCTIONS[package] = getattr(module, names[-1])
+        return function
+
+
+def preload(names):
+    """import modules, or functions given by their full name, before serving the first request"""
+    for name in names:
+        start = time.time()
+        try:
+            try:
+                importlib.import_module(name)
+            except ImportError as error:
+                # not a module, but maybe a function in one
+                try:
+                    import_function(name)
+                except (ImportError, AttributeError, ValueError):
+                    raise error
+        except Exception as error:
+            print("failed to preload {}: {}".format(name, error))
+        else:
+            print("preloaded {} in {:.3f}s".format(name, time.time() - start))
+
+
+def load_config(path):
+    """read default values of the server command options from a JSON file, options taking several values can be one string"""
+    with open(path) as f:
+        config = json.load(f)
+    options = {}
+    for key, value in config.items():
+        key = key.replace('-', '_')
+        if key in LIST_OPTIONS and isinstance(value, str):
+            value = [value]
+        options[key] = value
+    return options
+
+
+def call_function(package, args, kwargs):
+    """import and call a function by name, used to run functions in worker processes"""
+    return import_function(package)(*args, **kwargs)
+
+
+def next_value(iterator):
+    """compute the next value of a streamed generator in a worker thread, tagged as chunk, end or error"""
+    try:
+        return 'chunk', next(iterator)
+    except StopIteration:
+        return 'end', True
+    except Exception:
+        return 'error', traceback.format_exception(*sys.exc_info())
+
+
+class RemoteCallback(object):
+    """A callback function of the client, called on the server with a policy that limits the messages sent.
+
+    With a ``rate``, calls less than ``1 / rate`` seconds after the previous message are dropped.
+    With ``coalesce``, the latest of these calls is kept and sent once allowed, replacing older ones,
+    so that a solver calling back from a worker thread never queues up more than one message.
+    With ``delta``, arrays are sent as the rows that changed by more than ``tolerance`` since they were last sent.
+    If the client does not keep up, callers block until there is room for more messages, or with ``overflow='drop'``
+    their messages are dropped, see :meth:`CompasServerProtocol.push`.
+
+    Parameters
+    ----------
+    protocol : :class:`CompasServerProtocol`
+        The connection of the client.
+    options : dict
+        The reference sent by the client, with the id of the callback and its policy.
+
+    """
+
+    def __init__(self, protocol, options):
+        self.protocol = protocol
+        self.id = options['id']
+        self.interval = 1.0 / options['rate'] if options.get('rate') else 0
+        self.coalesce = options.get('coalesce', False)
+        self.delta = options.get('delta', False) and np is not None
+        self.tolerance = options.get('tolerance', 0)
+        self.overflow = options.get('overflow') or protocol.callback_overflow
+        self.sent = 0
+        self.pending = None
+        self.scheduled = False
+        self.dropped = 0
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def __call__(self, *args, **kwargs):
+        now = time.time()
+        with self.lock:
+            if not self.coalesce:
+                if now < self.sent + self.interval:
+                    self.dropped += 1
+                    return
+                self.sent = now
+            else:
+                if self.pending is not None:
+                    self.dropped += 1
+                self.pending = (args, kwargs)
+                if self.scheduled:
+                    return
+                self.scheduled = True
+        if self.coalesce:
+            self.protocol.in_loop(self.schedule, max(0, self.sent + self.interval - now))
+        else:
+            self.send(args, kwargs)
+
+    def schedule(self, delay):
+        """send the pending call after a delay, called in the event loop"""
+        if delay:
+            self.protocol.loop.call_later(delay, self.flush)
+        else:
+            self.flush()
+
+    def flush(self, force=False):
+        """send the pending call if there is one, called in the event loop
+
+        While the client does not keep up the call stays pending, unless forced, and is sent once it caught up.
+        """
+        if not self.coalesce:
+            # nothing is ever pending, and the lock may be held by a worker waiting for the event loop
+            return
+        if not force and not self.protocol.writable:
+            self.protocol.waiting.add(self)
+            return
+        with self.lock:
+            if self.pending is None:
+                return
+            args, kwargs = self.pending
+            self.pending = None
+            self.scheduled = False
+            self.sent = time.time()
+        self.send(args, kwargs)
+
+    def send(self, args, kwargs):
+        with self.lock:
+            data = {'callback': {'id': self.id, 'args': args, 'kwargs': kwargs}}
+            if self.delta:
+                changed = []
+                data['callback']['args'] = [self.encode(i, value, changed) for i, value in enumerate(args)]
+                data['callback']['kwargs'] = {key: self.encode(key, value, changed) for key, value in kwargs.items()}
+                data['callback']['delta'] = changed
+            if not self.protocol.push(data, self.overflow):
+                self.dropped += 1
+                # the client missed the changed rows, the next message sends the arrays in full
+                self.values = {}
+
+    def encode(self, key, value, changed):
+        """replace an array by its changed rows if fewer than half of them changed"""
+        if not isinstance(value, np.ndarray) or value.ndim == 0 or value.dtype.kind not in 'if':
+            return value
+        previous = self.values.get(key)
+        if previous is None or previous.shape != value.shape or previous.dtype != value.dtype:
+            self.values[key] = value.copy()
+            return value
+        difference = np.abs(value - previous) > self.tolerance if self.tolerance else value != previous
+        rows = np.flatnonzero(difference.reshape(len(value), -1).any(axis=1))
+        if 2 * len(rows) > len(value):
+            self.values[key] = value.copy()
+            return value
+        # the client applies the same rows to its copy, changes below the tolerance accumulate until they are sent
+        previous[rows] = value[rows]
+        changed.append(key)
+        return {'rows': rows, 'values': value[rows]}
 
 
 class CompasServerProtocol(WebSocketServerProtocol):
-    """The CompasServerProtocol defines the behaviour of compas cloud server"""
-    cached = {}
+    """The CompasServerProtocol defines the behaviour of compas cloud server
+
+    Function calls, batches and pipelines run in the thread pool ``executor`` so that the event loop keeps
+    serving other clients and control messages meanwhile. If ``processes`` is set, functions imported by name
+    are called in that process pool, functions using callbacks, cached functions and generators stay in the threads.
+
+    Results of calls asking for memoization, or of functions in the ``memoized`` allowlist,
+    are stored in ``memo`` under the hash of the function and its arguments, as copies that no caller can change.
+    Data cached under its content hash is shared by all clients that cached it, so functions get copies of it too.
+    """
+    cached = Cache()
+    functions = {}
+    sources = {}
+    memo = Cache(max_entries=1000)
+    memoized = set()
+    executor = None
+    processes = None
     sessions = None
     server_type = "NORMAL"
+    binary = False
+    codec = Codec()
+    callback_buffer = CALLBACK_BUFFER
+    callback_overflow = 'block'
 
     def onConnect(self, request):
-        """print client info on connection"""
+        """print client info on connection and select the codec offered by the client"""
         print("Client connecting: {}".format(request.peer))
+        self.streams = {}
+        self.callbacks = {}
+        self.loop = asyncio.get_event_loop()
+        self.thread = threading.get_ident()
+        self.closed = False
+        self.writable = True
+        self.waiting = set()
+        self.buffered = 0
+        self.buffer_space = threading.Condition()
+        protocol, self.codec = select_protocol(request.protocols)
+        if self.codec.compression:
+            # messages are already compressed by the codec, per-message deflate would only cost time
+            self.perMessageCompressionAccept = decline_deflate
+        if protocol:
+            print("Using {}".format(self.codec))
+        return protocol
 
     def onClose(self, wasClean, code, reason):
         """print reason on connection closes"""
         print("WebSocket connection closed: {}".format(reason))
+        if hasattr(self, 'buffer_space'):
+            with self.buffer_space:
+                # release workers waiting to send callbacks, their messages are dropped from now on
+                self.closed = True
+                self.buffer_space.notify_all()
+        for stream in getattr(self, 'streams', {}).values():
+            self.close_stream(stream)
+        if self.sessions_alive():
+            # the workers finish the tasks added so far and exit, nobody is listening anymore
+            self.sessions.socket = None
+            self.sessions.close(wait=False)
         if self.server_type == "ONCE":
             raise KeyboardInterrupt
 
     def onMessage(self, payload, isBinary):
-        """process the income messages"""
-        result = self.process(payload)
-        self.sendMessage(result.encode(), isBinary)
+        """process the income messages, replies use the same format as the client"""
+        self.binary = isBinary
+        data = loads(payload)
+        if 'ack' in data:
+            self.acknowledge(data)
+            return
+        if self.executor and self.blocking(data):
+            future = self.loop.run_in_executor(self.executor, self.process, data)
+            future.add_done_callback(lambda future: self.reply_future(data, future))
+            return
+        self.reply(data, self.process(data))
+
+    def blocking(self, data):
+        """check if a request may take long, so that it is processed in the executor instead of the event loop"""
+        if 'package' in data or 'batch' in data or 'pipeline' in data:
+            return True
+        if 'cache' in data or 'has' in data:
+            # hashing uploaded data takes as long as the data is large
+            return True
+        return 'sessions' in data and data['sessions']['command'] in ('result', 'listen', 'close')
+
+    def reply_future(self, data, future):
+        """send back the result of a request processed in the executor, or the error if it could not be processed"""
+        try:
+            result = future.result()
+        except Exception:
+            result = {'error': traceback.format_exception(*sys.exc_info())}
+            print("".join(result['error']))
+        self.reply(data, result)
+
+    def reply(self, data, result):
+        """send back the result of a request, tagged with the request id if the client gave one"""
+        # callbacks are added by calls running in the executor meanwhile
+        for callback in list(self.callbacks.values()):
+            # the last values passed to coalesced callbacks arrive before the result
+            callback.flush(force=True)
+        if 'id' in data:
+            if isinstance(result.get('result'), Iterator):
+                self.stream(data['id'], result['result'])
+                return
+            result['id'] = data['id']
+        elif 'result' in result:
+            # clients without request ids expect the bare result
+            result = result['result']
+        try:
+            self.send(result)
+        except Exception:
+            self.send_error(data, traceback.format_exception(*sys.exc_info()))
+
+    def send_error(self, data, error):
+        """send an error to the client in plain JSON, which encodes any traceback, so that the request is always answered"""
+        print("".join(error))
+        message = {'error': error}
+        if 'id' in data:
+            message['id'] = data['id']
+        self.send_payload(dumps(message))
+
+    def send(self, data):
+        """encode and send data to the client, small messages skip per-message deflate"""
+        self.send_payload(self.codec.encode(data, binary=self.binary))
+
+    def send_payload(self, payload):
+        """send an encoded message"""
+        if isinstance(payload, bytes):
+            self.sendMessage(payload, True, doNotCompress=len(payload) < COMPRESSION_THRESHOLD)
+        else:
+            self.sendMessage(payload.encode(), False, doNotCompress=len(payload) < COMPRESSION_THRESHOLD)
+
+    def stream(self, stream_id, iterator):
+        """stream the values of a returned generator to the client instead of collecting them in one reply"""
+        self.streams[stream_id] = {'iterator': iterator, 'credit': STREAM_WINDOW, 'busy': False, 'closed': False}
+        self.send({'id': stream_id, 'stream': STREAM_WINDOW})
+        self.pump(stream_id)
+
+    def pump(self, stream_id):
+        """compute the next value of a stream in the executor if the client has credit left
+
+        Only one value of a stream is computed at a time, the credit is only counted in the event loop.
+        """
+        stream = self.streams.get(stream_id)
+        if stream is None or stream['busy'] or stream['credit'] <= 0:
+            return
+        stream['busy'] = True
+        stream['credit'] -= 1
+        future = self.loop.run_in_executor(self.executor, next_value, stream['iterator'])
+        future.add_done_callback(lambda future: self.send_value(stream_id, stream, future.result()))
+
+    def send_value(self, stream_id, stream, value):
+        """send a value computed for a stream and continue with the next one"""
+        stream['busy'] = False
+        if stream['closed']:
+            # closed by the client or the connection while the value was computed
+            self.close_iterator(stream['iterator'])
+            return
+        kind, content = value
+        if kind != 'chunk':
+            del self.streams[stream_id]
+            if kind == 'error':
+                print("".join(content))
+            self.send({'stream': stream_id, kind: content})
+            return
+        try:
+            self.send({'stream': stream_id, 'chunk': content})
+        except Exception:
+            del self.streams[stream_id]
+            self.close_iterator(stream['iterator'])
+            self.send_error({'stream': stream_id}, traceback.format_exception(*sys.exc_info()))
+            return
+        self.pump(stream_id)
+
+    def acknowledge(self, data):
+        """give a stream more credit once the client consumed its values, or close it"""
+        stream_id = data['ack']
+        if stream_id not in self.streams:
+            return
+        if data.get('close'):
+            self.close_stream(self.streams.pop(stream_id))
+            return
+        self.streams[stream_id]['credit'] += data['count']
+        self.pump(stream_id)
+
+    def close_stream(self, stream):
+        """stop a stream that will not be consumed any further, once the value computed for it is done"""
+        stream['closed'] = True
+        if not stream['busy']:
+            self.close_iterator(stream['iterator'])
+
+    def close_iterator(self, iterator):
+        """stop a generator that will not be consumed any further"""
+        if hasattr(iterator, 'close'):
+            iterator.close()
 
     def callback(self, _id, *args, **kwargs):
         """send the arguments of callback functions to client side"""
         data = {'callback': {'id': _id, 'args': args, 'kwargs': kwargs}}
-        istring = json.dumps(data, cls=DataEncoder)
-        self.sendMessage(istring.encode())
+        self.push(data, self.callback_overflow)
+
+    def push(self, data, overflow='block'):
+        """send a callback message while the function calling back is still running, returns False if it was dropped
+
+        Messages from worker threads are encoded right away and handed to the event loop. At most ``callback_buffer``
+        of them wait there, and none while the transport is paused because the client does not read fast enough.
+        Beyond that the worker blocks until the client caught up, or its message is dropped with ``overflow='drop'``.
+        """
+        if threading.get_ident() == self.thread:
+            # the event loop can not wait for itself
+            self.send(data)
+            return True
+        payload = self.codec.encode(data, binary=self.binary)
+        with self.buffer_space:
+            while not self.closed and (self.buffered >= self.callback_buffer or not self.writable):
+                if overflow == 'drop':
+                    return False
+                self.buffer_space.wait()
+            if self.closed:
+                return False
+            self.buffered += 1
+        self.loop.call_soon_threadsafe(self.send_buffered, payload)
+        return True
+
+    def send_buffered(self, payload):
+        """send a message pushed by a worker thread and make room for the next one"""
+        self.send_payload(payload)
+        with self.buffer_space:
+            self.buffered -= 1
+            self.buffer_space.notify_all()
+
+    def pause_writing(self):
+        """called by the transport when its buffer is full, callbacks wait until the client caught up"""
+        with self.buffer_space:
+            self.writable = False
+
+    def resume_writing(self):
+        """called by the transport once its buffer drained, waiting callbacks continue"""
+        with self.buffer_space:
+            self.writable = True
+            self.buffer_space.notify_all()
+        waiting, self.waiting = self.waiting, set()
+        for callback in waiting:
+            callback.flush()
+
+    def in_loop(self, function, *args):
+        """call a function in the event loop, messages can only be sent from there"""
+        if threading.get_ident() == self.thread:
+            function(*args)
+        else:
+            self.loop.call_soon_threadsafe(function, *args)
 
     def load_cached(self, data):
         """detect and load cached data or callback functions in arguments"""
-        for i, a in enumerate(data['args']):
-            if isinstance(a, dict):
-                if 'cached' in a:
-                    data['args'][i] = self.cached[a['cached']]
-
-        for key in data['kwargs']:
-            if isinstance(data['kwargs'][key], dict):
-                if 'cached' in data['kwargs'][key]:
-                    data['kwargs'][key] = self.cached[data['kwargs'][key]['cached']]
-                if 'callback' in data['kwargs'][key]:
-                    _id = data['kwargs'][key]['callback']['id']
-                    self.cached[_id] = lambda *args, **kwargs: self.callback(
-                        _id, *args, **kwargs)
-                    data['kwargs'][key] = self.cached[_id]
+        def load(value):
+            if isinstance(value, dict):
+                if 'cached' in value:
+                    cached = self.cached[value['cached']]
+                    if len(value['cached']) == HASH_LENGTH:
+                        # shared with other references and clients, changes in place would reach them as well
+                        return copy.deepcopy(cached)
+                    return cached
+                if 'callback' in value:
+                    _id = value['callback']['id']
+                    if _id not in self.callbacks:
+                        self.callbacks[_id] = RemoteCallback(self, value['callback'])
+                    return self.callbacks[_id]
+            return value
+
+        data['args'] = [load(a) for a in data['args']]
+        data['kwargs'] = {key: load(value) for key, value in data['kwargs'].items()}
 
     def execute(self, data):
         """execute corresponding binded functions with received arguments"""
         package = data['package']
 
         if isinstance(package, dict):
-            function = self.cached[package['cached_func']]
+            function = self.functions[package['cached_func']]
         else:
-            names = package.split('.')
-            name = '.'.join(names[:-1])
-            module = importlib.import_module(name)
-            function = getattr(module, names[-1])
+            function = import_function(package)
 
         start = time.time()
-        print('running:', package)
-        self.load_cached(data)
+        key = self.memo_key(data)
+        result = self.memo.get(key, MISSING) if key is not None else MISSING
 
-        if data['cache']:
-            to_cache = function(*data['args'], **data['kwargs'])
-            self.cached[id(to_cache)] = to_cache
-            result = {'cached': id(to_cache)}
+        if result is not MISSING:
+            print('memoized:', package)
+            # the caller may change the result in place, like the functions it is cached for or passed to
+            result = copy.deepcopy(result)
         else:
-            result = function(*data['args'], **data['kwargs'])
+            print('running:', package)
+            self.load_cached(data)
+
+            if self.in_process(function, data):
+                result = self.processes.submit(call_function, package, data['args'], data['kwargs']).result()
+            else:
+                result = function(*data['args'], **data['kwargs'])
+
+            if key is not None and not isinstance(result, Iterator):
+                self.memo[key] = copy.deepcopy(result)
+
+        if data['cache']:
+            result = {'cached': self.cached.add(result)}
         t = time.time()-start
         print('finished in: {}s'.format(t))
         return result
 
+    def memo_key(self, data):
+        """the key of the memoized result of a call, None if the call is not memoized
+
+        Cached arguments are hashed by their reference, which is unique or the hash of their content.
+        """
+        package = data['package']
+        if isinstance(package, dict):
+            if not data.get('memoize'):
+                return None
+            package = [package['cached_func'], self.sources.get(package['cached_func'])]
+        elif not data.get('memoize') and package not in self.memoized:
+            return None
+        arguments = list(data['args']) + list(data['kwargs'].values())
+        if any(isinstance(value, dict) and 'callback' in value for value in arguments):
+            return None
+        return content_hash([package, data['args'], data['kwargs']])[0]
+
+    def in_process(self, function, data):
+        """check if a function call can be sent to the process pool"""
+        if self.processes is None or not isinstance(data['package'], str) or inspect.isgeneratorfunction(function):
+            return False
+        return not any(callable(value) for value in list(data['args']) + list(data['kwargs'].values()))
+
+    def batch(self, data):
+        """run a list of operations in order, references to results of earlier operations are resolved on the way"""
+        results = []
+        for i, operation in enumerate(data['batch']):
+            self.load_batched(operation, results)
+            try:
+                results.append(self.handle(operation))
+            except Exception as error:
+                raise RuntimeError("Batch operation {} failed: {}".format(i, error)) from error
+        return results
+
+    def load_batched(self, data, results):
+        """replace references to earlier batch results in the arguments of an operation"""
+        def load(value):
+            if isinstance(value, dict) and 'batched' in value:
+                return results[value['batched']]
+            return value
+
+        if 'package' in data:
+            data['args'] = [load(a) for a in data['args']]
+            data['kwargs'] = {key: load(value) for key, value in data['kwargs'].items()}
+        elif 'cache' in data:
+            data['cache'] = load(data['cache'])
+        elif 'get' in data:
+            data['get'] = load(data['get'])
+            if isinstance(data['get'], dict):
+                data['get'] = data['get']['cached']
+
+    def pipeline(self, data):
+        """run a chain of functions where each step consumes the output of the previous one"""
+        pipeline = data['pipeline']
+        result = pipeline['input']
+
+        def is_previous(value):
+            return isinstance(value, dict) and value.get('previous') is True
+
+        for _ in range(pipeline['repeat']):
+            for step in pipeline['steps']:
+                args = [result if is_previous(a) else a for a in step['args']]
+                kwargs = {key: result if is_previous(value) else value for key, value in step['kwargs'].items()}
+                if not any(map(is_previous, step['args'])) and not any(map(is_previous, step['kwargs'].values())):
+                    args.insert(0, result)
+                result = self.execute({'package': step['package'], 'cache': False, 'args': args, 'kwargs': kwargs})
+
+        if pipeline['cache']:
+            return self.cache({'cache': result})
+        return result
+
     def get(self, data):
         """get cached data from its id"""
         _id = data['get']
         return self.cached[_id]
 
     def cache(self, data):
-        """cache received data and return its reference object"""
-        to_cache = data['cache']
-        _id = id(to_cache)
-        self.cached[_id] = to_cache
-        return {'cached': _id}
+        """cache received data and return its reference object, data with a content hash is stored once under its hash
+
+        The hash given by the client is checked, data that does not match it is cached under a new unique key.
+        Data stored under its hash never changes, functions it is passed to get a copy, so its hash stays valid.
+        """
+        if 'hash' in data:
+            key = data['hash']
+            cached = self.find_hashed(key, data.get('ttl'))
+            if cached:
+                return cached
+            if key not in self.cached and content_hash(data['cache'])[0] == key:
+                self.cached.set(key, data['cache'], data.get('ttl'))
+                return {'cached': key}
+        return {'cached': self.cached.add(data['cache'], data.get('ttl'))}
+
+    def has(self, data):
+        """return the reference of cached data with the given content hash, or None if it is not cached"""
+        return self.find_hashed(data['has'], data.get('ttl'))
+
+    def find_hashed(self, key, ttl=None):
+        """the reference of data cached under its content hash, kept at least for ``ttl`` from now"""
+        if not isinstance(key, str) or len(key) != HASH_LENGTH or key not in self.cached:
+            return None
+        self.cached.extend(key, ttl)
+        return {'cached': key}
 
     def cache_func(self, data):
         """cache a excutable function"""
         name = data['cache_func']['name']
         exec(data['cache_func']['source'])
-        exec('self.cached[name] = {}'.format(name))
+        exec('self.functions[name] = {}'.format(name))
+        self.sources[name] = data['cache_func']['source']
         return {'cached_func': name}
 
     def sessions_alive(self):
@@ -116,6 +664,8 @@ class CompasServerProtocol(WebSocketServerProtocol):
         if command == 'check':
             print('check from client')
             return {'status': "I'm good"}
+        if command == 'stats':
+            return {'cache': self.cached.stats(), 'memo': self.memo.stats()}
         if command == 'once':
             self.server_type = "ONCE"
             print('Setting Server type to ONCE, server will be closed once this client disconnect.')
@@ -127,20 +677,28 @@ class CompasServerProtocol(WebSocketServerProtocol):
         """control attached sessions according to message received"""
         s = data["sessions"]
         if s["command"] == 'create':
-            if not self.sessions_alive():
-                self.sessions = Sessions(socket=self)
-                return "session successfully created"
-            else:
+            if self.sessions_alive() and not self.sessions.all_finished():
                 raise RuntimeError("There is already sessions running, try to reconnect or shut down")
+            if self.sessions_alive():
+                self.sessions.close()
+            self.sessions = Sessions(*s['args'], socket=self, **s['kwargs'])
+            return "session successfully created"
         else:
             if not self.sessions_alive():
                 raise RuntimeError("There no running sessions, try to create one first")
 
             if s["command"] == 'add_task':
                 func_id = s['func']['cached_func']
-                func = self.cached[func_id]
-                self.sessions.add_task(func, *s['args'], *s['kwargs'])
-                return "task added"
+                # functions defined by exec can not be pickled, the workers define them again from their source
+                func = SourceFunction(func_id, self.sources[func_id])
+                task = self.sessions.submit(func, s['args'], s['kwargs'], s.get('timeout'), s.get('retries'))
+                return {'task': task.id}
+
+            if s["command"] == 'result':
+                result = self.sessions.result(s['task'])
+                if s.get('cache'):
+                    return {'cached': self.cached.add(result)}
+                return result
 
             if s["command"] == 'start':
                 self.sessions.start()
@@ -148,51 +706,65 @@ class CompasServerProtocol(WebSocketServerProtocol):
 
             if s["command"] == 'listen':
                 self.sessions.listen()
-                self.sessions = None
                 return "All sessions concluded"
 
+            if s["command"] == 'close':
+                self.sessions.close()
+                self.sessions = None
+                return "sessions closed"
+
             if s["command"] == 'shutdown':
                 self.sessions.terminate()
                 self.sessions = None
 
     def process(self, data):
-        """process received data according to its content"""
-        data = json.loads(data, cls=DataDecoder)
-
+        """process received data according to its content, errors are returned as formatted tracebacks"""
         try:
+            return {'result': self.handle(data)}
 
-            if 'cache' in data:
-                result = self.cache(data)
+        except BaseException as error:
 
-            if 'cache_func' in data:
-                result = self.cache_func(data)
+            if isinstance(error, KeyboardInterrupt):
+                raise KeyboardInterrupt
 
-            if 'package' in data:
-                result = self.execute(data)
+            exc_type, exc_value, exc_tb = sys.exc_info()
+            result = {'error': traceback.format_exception(exc_type, exc_value, exc_tb)}
+            print("".join(result['error']))
+            return result
 
-            if 'get' in data:
-                result = self.get(data)
+    def handle(self, data):
+        """dispatch received data to the corresponding action"""
+        if 'batch' in data:
+            return self.batch(data)
 
-            if 'sessions' in data:
-                result = self.control_sessions(data)
+        if 'pipeline' in data:
+            return self.pipeline(data)
 
-            if 'control' in data:
-                result = self.control(data)
+        if 'package' in data:
+            return self.execute(data)
 
-            if 'version' in data:
-                result = self.version()
+        if 'cache' in data:
+            return self.cache(data)
 
-        except BaseException as error:
+        if 'cache_func' in data:
+            return self.cache_func(data)
 
-            if isinstance(error, KeyboardInterrupt):
-                raise KeyboardInterrupt
+        if 'has' in data:
+            return self.has(data)
 
-            exc_type, exc_value, exc_tb = sys.exc_info()
-            result = {'error': traceback.format_exception(exc_type, exc_value, exc_tb)}
-            print("".join(result['error']))
+        if 'get' in data:
+            return self.get(data)
+
+        if 'sessions' in data:
+            return self.control_sessions(data)
+
+        if 'control' in data:
+            return self.control(data)
+
+        if 'version' in data:
+            return self.version()
 
-        istring = json.dumps(result, cls=DataEncoder)
-        return istring
+        raise ValueError("Unrecognised message")
 
     def version(self):
 
@@ -206,32 +778,88 @@ class CompasServerProtocol(WebSocketServerProtocol):
         }
 
 
-if __name__ == '__main__':
-
-    import argparse
-
-    try:
-        import asyncio
-    except ImportError:
-        # Trollius >= 0.3 was renamed
-        import trollius as asyncio
-
+def serve(host='127.0.0.1', port=9009, sock=None, pool='thread', pool_size=None, cache_entries=None, cache_memory=None, cache_ttl=None, cache_dir=None,
+          cache_disk=None, memoize=(), memo_entries=1000, memo_memory=None, preload_modules=(), ready_port=None, callback_buffer=CALLBACK_BUFFER, callback_overflow='block'):
+    """run a server until it is shut down, on a listening socket if given
+
+    Parameters
+    ----------
+    host : str, optional
+        The host ip to listen at.
+    port : int, optional
+        The port to listen at, ``0`` picks a free port.
+    sock : socket.socket, optional
+        An already listening socket, shared by the workers of :func:`supervise`.
+    pool : {'thread', 'process'}, optional
+        Where function calls are executed.
+    pool_size : int, optional
+        The number of pool workers, defaults to the number of processors.
+    cache_entries : int, optional
+        The maximum number of cached objects, unlimited by default.
+    cache_memory : float, optional
+        The memory budget of cached objects in megabytes, unlimited by default.
+    cache_ttl : float, optional
+        Seconds before cached objects expire, never by default.
+    cache_dir : str, optional
+        The directory cached objects are written to when they are evicted or the server shuts down,
+        and loaded from after a restart.
+    cache_disk : float, optional
+        The disk budget of the cache directory in megabytes, the least recently used files are deleted beyond it.
+        Unlimited by default.
+    memoize : list of str, optional
+        Functions whose results are always memoized, like ``compas.numerical.dr_numpy``.
+    memo_entries : int, optional
+        The maximum number of memoized results.
+    memo_memory : float, optional
+        The memory budget of memoized results in megabytes, unlimited by default.
+    preload_modules : list of str, optional
+        Modules or functions imported before the server starts listening.
+    ready_port : int, optional
+        The local port of a :class:`Proxy` waiting for the server, which is sent the port once the server is listening.
+    callback_buffer : int, optional
+        The number of callback messages that may wait to be sent while a function is running.
+    callback_overflow : {'block', 'drop'}, optional
+        Whether functions calling back wait for a slow client or their messages are dropped, unless set per callback.
+
+    """
     from autobahn.asyncio.websocket import WebSocketServerFactory
-    factory = WebSocketServerFactory()
-    factory.protocol = CompasServerProtocol
 
-    parser = argparse.ArgumentParser()
-    parser.add_argument("--port", default=9009)
-    args = parser.parse_args()
+    preload(preload_modules)
 
-    ip = '127.0.0.1'
-    port = int(args.port)
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
 
-    loop = asyncio.get_event_loop()
-    coro = loop.create_server(factory, '127.0.0.1', port)
+    factory = WebSocketServerFactory(loop=loop)
+    factory.protocol = CompasServerProtocol
+    factory.setProtocolOptions(perMessageCompressionAccept=accept_deflate)
+
+    if cache_memory is not None:
+        cache_memory = int(cache_memory * 2**20)
+    if cache_disk is not None:
+        cache_disk = int(cache_disk * 2**20)
+    CompasServerProtocol.cached = Cache(cache_entries, cache_memory, cache_ttl, cache_dir, cache_disk)
+    if memo_memory is not None:
+        memo_memory = int(memo_memory * 2**20)
+    CompasServerProtocol.memo = Cache(memo_entries, memo_memory)
+    CompasServerProtocol.memoized = set(memoize)
+    CompasServerProtocol.callback_buffer = callback_buffer
+    CompasServerProtocol.callback_overflow = callback_overflow
+
+    CompasServerProtocol.executor = ThreadPoolExecutor(pool_size)
+    if pool == 'process':
+        CompasServerProtocol.processes = ProcessPoolExecutor(pool_size)
+    print("executing functions in a {} pool".format(pool))
+
+    if sock is not None:
+        coro = loop.create_server(factory, sock=sock)
+    else:
+        coro = loop.create_server(factory, host, port)
     server = loop.run_until_complete(coro)
+    port = server.sockets[0].getsockname()[1]
     print("starting compas_cloud server")
-    print("Listenning at %s:%s" % (ip, port))
+    print("Listenning at %s:%s" % (host, port))
+    if ready_port:
+        notify_ready(ready_port, port)
 
     try:
         loop.run_forever()
@@ -241,3 +869,144 @@ if __name__ == '__main__':
         print("shuting down server")
         server.close()
         loop.close()
+        CompasServerProtocol.cached.flush()
+        CompasServerProtocol.executor.shutdown(wait=False)
+        if CompasServerProtocol.processes:
+            CompasServerProtocol.processes.shutdown(wait=False)
+
+
+def notify_ready(ready_port, port):
+    """tell the proxy that started this server that it is listening, and at which port"""
+    connection = socket.create_connection(('127.0.0.1', ready_port))
+    try:
+        connection.sendall('{}\n'.format(port).encode())
+    finally:
+        connection.close()
+
+
+def supervise(host='127.0.0.1', port=9009, workers=2, **kwargs):
+    """pre-fork server processes that share one listening socket, restarting workers that crash
+
+    The kernel hands every new connection to one of the workers, which serves it until it closes.
+    Cached data and sessions live in the worker of the connection that created them,
+    so references to cached data are only valid on the same connection.
+    Once a worker shuts down cleanly, for example by a ``shutdown`` control message, all workers are stopped.
+    Only available on platforms that support ``os.fork``.
+
+    Parameters
+    ----------
+    host : str, optional
+        The host ip to listen at.
+    port : int, optional
+        The port to listen at.
+    workers : int, optional
+        The number of server processes.
+    kwargs : dict, optional
+        Passed to :func:`serve` in every worker.
+
+    Modules are preloaded once before forking, so that the workers share them.
+    """
+    preload(kwargs.pop('preload_modules', ()))
+
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(128)
+    port = sock.getsockname()[1]
+    ready_port = kwargs.pop('ready_port', None)
+
+    children = set()
+
+    def spawn():
+        pid = os.fork()
+        if pid == 0:
+            code = 0
+            try:
+                serve(host, port, sock=sock, **kwargs)
+            except BaseException:
+                traceback.print_exc()
+                code = 1
+            finally:
+                sys.stdout.flush()
+                os._exit(code)
+        children.add(pid)
+
+    for _ in range(workers):
+        spawn()
+    print("supervising {} workers at {}:{}".format(workers, host, port))
+    if ready_port:
+        # connections wait in the backlog of the listening socket until a worker accepts them
+        notify_ready(ready_port, port)
+
+    try:
+        while children:
+            pid, status = os.wait()
+            children.discard(pid)
+            if status == 0:
+                break
+            print("worker {} exited with status {}, restarting".format(pid, status))
+            time.sleep(0.5)
+            spawn()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for pid in children:
+            os.kill(pid, signal.SIGTERM)
+        for pid in children:
+            os.waitpid(pid, 0)
+        sock.close()
+        print("all workers stopped")
+
+
+if __name__ == '__main__':
+
+    import argparse
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--config", default=None, help="JSON file with default values of these options, like {\"preload\": [\"compas.numerical\"]}")
+    parser.add_argument("--port", default=9009, help="port to listen at, 0 picks a free port")
+    parser.add_argument("--ready-port", type=int, default=None, help="local port that is sent the port of the server once it is listening")
+    parser.add_argument("--pool", choices=['thread', 'process'], default='thread', help="where function calls are executed")
+    parser.add_argument("--pool-size", type=int, default=None, help="number of workers, defaults to the number of processors")
+    parser.add_argument("--workers", type=int, default=1, help="number of pre-forked server processes sharing the port")
+    parser.add_argument("--cache-entries", type=int, default=None, help="maximum number of cached objects")
+    parser.add_argument("--cache-memory", type=float, default=None, help="memory budget of cached objects in MB")
+    parser.add_argument("--cache-ttl", type=float, default=None, help="seconds before cached objects expire")
+    parser.add_argument("--cache-dir", default=None, help="directory of the disk tier of the cache, kept across restarts")
+    parser.add_argument("--cache-disk", type=float, default=None, help="disk budget of the cache directory in MB")
+    parser.add_argument("--memoize", nargs='*', default=[], help="functions whose results are always memoized")
+    parser.add_argument("--memo-entries", type=int, default=1000, help="maximum number of memoized results")
+    parser.add_argument("--memo-memory", type=float, default=None, help="memory budget of memoized results in MB")
+    parser.add_argument("--callback-buffer", type=int, default=CALLBACK_BUFFER, help="number of callback messages waiting to be sent before callbacks block or drop")
+    parser.add_argument("--callback-overflow", choices=['block', 'drop'], default='block', help="what callbacks do when the client does not keep up")
+    parser.add_argument("--preload", action='append', default=None, help="comma separated modules or functions imported before serving")
+
+    config, _ = parser.parse_known_args()
+    preload_names = []
+    if config.config:
+        defaults = load_config(config.config)
+        # a default of an appending option would be extended by the command line instead of replaced
+        preload_names = defaults.pop('preload', [])
+        parser.set_defaults(**defaults)
+    args = parser.parse_args()
+    if args.preload is not None:
+        preload_names = args.preload
+
+    preload_modules = [name.strip() for names in preload_names for name in names.split(',') if name.strip()]
+
+    options = {'pool': args.pool, 'pool_size': args.pool_size,
+               'cache_entries': args.cache_entries, 'cache_memory': args.cache_memory, 'cache_ttl': args.cache_ttl, 'cache_dir': args.cache_dir,
+               'cache_disk': args.cache_disk,
+               'memoize': args.memoize, 'memo_entries': args.memo_entries, 'memo_memory': args.memo_memory,
+               'preload_modules': preload_modules, 'ready_port': args.ready_port,
+               'callback_buffer': args.callback_buffer, 'callback_overflow': args.callback_overflow}
+
+    ip = '127.0.0.1'
+    port = int(args.port)
+
+    if args.workers > 1:
+        if not hasattr(os, 'fork'):
+            parser.error("--workers is only supported on platforms with os.fork")
+        supervise(ip, port, args.workers, **options)
+    else:
+        serve(ip, port, **options)
@@ -1,11 +1,12 @@
 import asyncio
 import websockets
 
-from compas.utilities import DataEncoder
-from compas.utilities import DataDecoder
 import importlib
 import json
 from compas_cloud import Sessions
+from compas_cloud.serialization import loads
+from compas_cloud.serialization import subprotocols
+from compas_cloud.serialization import Codec
 from multiprocessing import Queue
 
 
@@ -38,9 +39,12 @@ class Server_Websockets():
 
         self.cached = {}
         self.websocket = None
+        self.binary = False
+        self.codec = Codec()
 
         async def user_session(websocket, path):
             self.websocket = websocket
+            self.codec = Codec.from_protocol(websocket.subprotocol)
             print('user connected', websocket, path)
             self.messages_to_send = Queue()
 
@@ -48,6 +52,7 @@ class Server_Websockets():
                 while True:
                     try:
                         data = await self.websocket.recv()
+                        self.binary = isinstance(data, bytes)
                         result = await self.process(data)
                         await self.websocket.send(result)
 
@@ -75,7 +80,8 @@ class Server_Websockets():
 
             self.websocket = None
 
-        start_server = websockets.serve(user_session, host, port)
+        # per-message deflate is negotiated by websockets, faster serializers and compressions are offered as subprotocols
+        start_server = websockets.serve(user_session, host, port, compression='deflate', subprotocols=subprotocols())
         self.loop = asyncio.get_event_loop()
         self.loop.run_until_complete(start_server)
         print('started server')
@@ -84,8 +90,11 @@ class Server_Websockets():
     def callback(self, _id, *args, **kwargs):
         """send the arguments of callback functions to client side"""
         data = {'callback': {'id': _id, 'args': args, 'kwargs': kwargs}}
-        istring = json.dumps(data, cls=DataEncoder)
-        self.messages_to_send.put(istring)
+        self.messages_to_send.put(self.encode(data))
+
+    def encode(self, data):
+        """encode outgoing data with the negotiated codec, as binary frames or JSON text depending on the client"""
+        return self.codec.encode(data, binary=self.binary)
 
     def load_cached(self, data):
         """detect and load cached data or callback functions in arguments"""
@@ -190,7 +199,7 @@ class Server_Websockets():
 
     async def process(self, data):
         """process received data according to its content"""
-        data = json.loads(data, cls=DataDecoder)
+        data = loads(data)
 
         try:
 
@@ -209,12 +218,18 @@ class Server_Websockets():
             if 'sessions' in data:
                 result = await self.control_sessions(data)
 
+            result = {'result': result}
+
         except BaseException as error:
             result = {'error': '{}:{}'.format(type(error).__name__, error)}
             print(result)
 
-        istring = json.dumps(result, cls=DataEncoder)
-        return istring
+        if 'id' in data:
+            result['id'] = data['id']
+        elif 'result' in result:
+            result = result['result']
+
+        return self.encode(result)
 
 
 # if __name__ == "main":
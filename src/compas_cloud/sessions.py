@@ -5,52 +5,300 @@ from __future__ import print_function
 import time
 import os
 import sys
-import json
-from multiprocessing import Process, Queue, cpu_count
+import atexit
+import heapq
+import pickle
+import uuid
+from multiprocessing import Array, Pipe, Process, Queue, cpu_count
+from collections import deque
 from contextlib import contextmanager
 import traceback
+from threading import Lock
+from threading import RLock
 from threading import Thread
 
 try:
-    from StringIO import StringIO
+    from queue import Empty
 except ImportError:
-    from io import StringIO
+    from Queue import Empty
 
+try:
+    import numpy as np
+except ImportError:
+    np = None
 
-class CapturedText(object):
-    log_path = None
+from .cache import estimate_size
 
+# lines of output of every task kept in memory by the session
+LOG_LINES = 1000
 
-@contextmanager
-def captured(name=None, log_path=None):
+# output without line breaks is passed on once it gets this long
+MAX_LINE = 2**16
+
+
+def read_lines(fd, output):
+    """read from a pipe until it is closed, passing on all complete lines that arrived at once"""
+    rest = b''
+    with os.fdopen(fd, 'rb', 0) as pipe:
+        while True:
+            chunk = pipe.read(MAX_LINE)
+            if not chunk:
+                break
+            lines, newline, rest = (rest + chunk).rpartition(b'\n')
+            if lines or newline:
+                output((lines + newline).decode(errors='replace'))
+            if len(rest) >= MAX_LINE:
+                output(rest.decode(errors='replace'))
+                rest = b''
+    if rest:
+        output(rest.decode(errors='replace'))
 
-    stdout = sys.stdout
-    stderr = sys.stderr
 
+@contextmanager
+def captured(log_path=None, output=None):
+    """redirect the output of a task to a log file, or to a pipe whose lines are passed to ``output``
+
+    The file descriptors of stdout and stderr are redirected, so that the output of extension modules
+    and subprocesses is captured too. The pipe is read by a thread that blocks until there is output.
+    """
+    sys.stdout.flush()
+    sys.stderr.flush()
+    saved = os.dup(1), os.dup(2)
+    reader = None
     if log_path:
-        sys.stdout = sys.stderr = open(log_path, "w", 1)
+        target = os.open(log_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
     else:
-        sys.stdout = sys.stderr = StringIO()
-    c = CapturedText()
-    c.name = name
-    c.outfile = sys.stdout
-    c.log_path = log_path
+        fd, target = os.pipe()
+        reader = Thread(target=read_lines, args=(fd, output))
+        reader.daemon = True
+        reader.start()
+    os.dup2(target, 1)
+    os.dup2(target, 2)
+    os.close(target)
 
-    yield c
+    stdout, stderr = sys.stdout, sys.stderr
+    sys.stdout = sys.stderr = open(1, 'w', buffering=1, closefd=False)
+    try:
+        yield
+    finally:
+        sys.stdout.flush()
+        sys.stdout, sys.stderr = stdout, stderr
+        os.dup2(saved[0], 1)
+        os.dup2(saved[1], 2)
+        os.close(saved[0])
+        os.close(saved[1])
+        if reader is not None:
+            # the pipe is closed now, unless a subprocess started by the task still has it open
+            reader.join(1)
 
-    if log_path:
-        c.outfile.close()
 
-    sys.stdout = stdout
-    sys.stderr = stderr
+# states of tasks that will not change anymore
+DONE = ("finished", "failed", "timeout")
+
+# seconds between checks that the workers are still alive
+CHECK_INTERVAL = 1.0
+
+# results of tasks larger than this are written to the result directory of the session if it has one
+RESULT_THRESHOLD = 2**20
+
+
+class TaskError(RuntimeError):
+    """Raised when the result of a task that failed is requested, with the traceback of the task"""
+
+
+def pack_result(result, key, directory=None):
+    """prepare the result of a task to be sent to the session, as its pickle or the path of the file it was written to
+
+    Results are written to ``<key>.npy`` for numeric arrays, that the session memory-maps, or to ``<key>.pickle``.
+    """
+    if directory and estimate_size(result) >= RESULT_THRESHOLD:
+        numeric = np is not None and isinstance(result, np.ndarray) and result.dtype.kind in 'biufc'
+        path = os.path.join(directory, key + ('.npy' if numeric else '.pickle'))
+        temp = path + '.tmp'
+        with open(temp, 'wb') as f:
+            if numeric:
+                np.save(f, result)
+            else:
+                pickle.dump(result, f, pickle.HIGHEST_PROTOCOL)
+        os.replace(temp, path)
+        return None, path
+    return pickle.dumps(result, pickle.HIGHEST_PROTOCOL), None
+
+
+def load_result(path):
+    """load a result written by :func:`pack_result`, arrays are memory-mapped copy-on-write"""
+    if path.endswith('.npy'):
+        return np.load(path, mmap_mode='c')
+    with open(path, 'rb') as f:
+        return pickle.load(f)
+
+
+def work(waiting, messages, session_id, result_dir, slot):
+    """run tasks from the waiting queue in a worker process until it receives None
+
+    The task and attempt that is running is kept in the shared ``slot``, so that the session
+    knows which task was lost if the worker dies before its messages arrive.
+    """
+    pid = os.getpid()
+    messages.put(("message", "worker {} started".format(pid)))
+    for task_id, attempt, payload, timeout in iter(waiting.get, None):
+        func, args, kwargs, log_path = pickle.loads(payload)
+        slot[0], slot[1] = task_id, attempt
+        messages.put(("task_running", (task_id, attempt, pid)))
+        if log_path:
+            messages.put(("message", "task-{}: streaming log to {}".format(task_id, log_path)))
+        task = (task_id, attempt, func, args, kwargs, log_path, session_id, result_dir)
+        if timeout is None:
+            run_task(messages.put, *task)
+        else:
+            run_child(messages, timeout, task)
+        slot[0] = -1
+
+    messages.put(("message", "worker {} terminated".format(pid)))
 
 
-TASK_FINISHED = "____FINISHED____"
+def run_task(send, task_id, attempt, func, args, kwargs, log_path, session_id, result_dir):
+    """run a task with its output captured, and send its output and its result or error"""
+
+    def output(text):
+        send(("task_log", (task_id, text)))
+
+    with captured(log_path, output):
+        try:
+            result = func(*args, **kwargs)
+            result = pack_result(result, session_id + str(task_id), result_dir)
+            error = None
+        except Exception:
+            error = traceback.format_exc()
+            print(error, end="")
+
+    if error is None:
+        send(("task_finished", (task_id, attempt, result)))
+    else:
+        send(("task_failed", (task_id, attempt, error)))
+
+
+def run_child(messages, timeout, task):
+    """run a task in a child process of the worker, which is killed once the task runs longer than ``timeout``
+
+    The child sends its messages through a pipe of its own that the worker passes on. A process killed while
+    sending can leave a queue locked or half written, which would break the queue all workers share.
+    """
+    task_id, attempt = task[:2]
+    reader, writer = Pipe(duplex=False)
+    child = Process(target=child_task, args=(writer, task))
+    child.start()
+    # the child holds the only writing end, so that reading ends once it exits
+    writer.close()
+    deadline = time.time() + timeout
+    done = False
+    try:
+        while not done and reader.poll(max(0, deadline - time.time())):
+            message = reader.recv()
+            messages.put(message)
+            done = message[0] in ("task_finished", "task_failed")
+    except EOFError:
+        pass
+    reader.close()
+    if done:
+        child.join()
+    elif child.is_alive() and time.time() >= deadline:
+        child.kill()
+        child.join()
+        messages.put(("task_timeout", (task_id, attempt, timeout)))
+    else:
+        child.join()
+        error = "task process {} died with exit code {}".format(child.pid, child.exitcode)
+        messages.put(("task_failed", (task_id, attempt, error)))
+
+
+def child_task(writer, task):
+    lock = Lock()
+
+    # the output is sent by a reader thread while the task is running
+    def send(message):
+        with lock:
+            writer.send(message)
+
+    run_task(send, *task)
+
+
+class TaskFuture(object):
+    """A handle to the result of a task added to :class:`Sessions`.
+
+    Parameters
+    ----------
+    sessions : :class:`Sessions`
+        The session the task was added to.
+    task_id : int
+        The id of the task.
+
+    """
+
+    def __init__(self, sessions, task_id):
+        self.sessions = sessions
+        self.id = task_id
+        self.fetched = False
+        self.value = None
+
+    def __repr__(self):
+        return "TaskFuture(task-{}, {})".format(self.id, self.sessions.states[self.id])
+
+    def done(self):
+        """check if the task finished, failed or timed out, as far as the messages of the workers were processed"""
+        return self.sessions.states[self.id] in DONE
+
+    def result(self):
+        """wait for the task and return its result, raises :class:`TaskError` if it failed or timed out
+
+        The session hands out a result only once, the future keeps it for later calls.
+        """
+        if not self.fetched:
+            self.value = self.sessions.result(self.id)
+            self.fetched = True
+        return self.value
+
+
+class SourceFunction(object):
+    """A function given by its source code, which can be sent to the workers unlike functions defined with ``exec``.
+
+    The source is executed in the worker the first time the function is called.
+
+    Parameters
+    ----------
+    name : str
+        The name of the function defined in the source.
+    source : str
+        The source code of the function.
+
+    """
+
+    def __init__(self, name, source):
+        self.name = name
+        self.source = source
+        self.function = None
+
+    def __getstate__(self):
+        return {'name': self.name, 'source': self.source}
+
+    def __setstate__(self, state):
+        self.__init__(state['name'], state['source'])
+
+    def __call__(self, *args, **kwargs):
+        if self.function is None:
+            namespace = {}
+            exec(self.source, namespace)
+            self.function = namespace[self.name]
+        return self.function(*args, **kwargs)
 
 
 class Sessions():
     """a task-manager class that helps to execute a batch of long-lasting tasks such as FEA and DEM simulations.
 
+    Tasks can be added before and after the session started, workers wait for new tasks until the session is closed.
+    Tasks are sent to the workers through a queue, so their functions and arguments have to be picklable:
+    functions are defined at the top level of a module, or are :class:`SourceFunction`.
+
     Parameters
     ----------
     log_path : str, optional
@@ -59,8 +307,30 @@ class Sessions():
     worker_num : int, optional
         The number of workers to execute tasks in parallel.
         Default is equal to number of available CPUs.
+    result_dir : str, optional
+        The folder results larger than ``RESULT_THRESHOLD`` are written to instead of being sent through the queue,
+        preferably on a local or in-memory file system like ``/dev/shm``. Arrays are memory-mapped from there.
+        By default all results are sent through the queue.
+    timeout : float, optional
+        Seconds a task may run before it is stopped, unless given per task. Tasks with a timeout run in a child
+        process of their worker, which is killed once the time is up.
+        Tasks run without a limit by default.
+    retries : int, optional
+        How often a task that failed or timed out is run again, unless given per task.
+        Default is ``0``.
+    backoff : float, optional
+        Seconds before the first retry of a task, doubled for every further retry.
+        Default is ``1.0``.
     socket: internal use only
 
+    Notes
+    -----
+    Timeouts and retries are handled while the session processes the messages of the workers,
+    in :meth:`listen`, :meth:`result` and :meth:`close`, which may be called from several threads.
+
+    Results are dropped from the session once they are handed out by :meth:`result`, together with their files
+    in ``result_dir``. Results that were not handed out are dropped by :meth:`close`.
+
     Examples
     --------
 
@@ -74,142 +344,335 @@ class Sessions():
                 time.sleep(1)
                 print('sleeped ', i, 's')
 
+        s = Sessions()
         s.add_task(func, 1)
         s.start()
         s.listen()
 
+        task = s.add_task(func, 2)
+        print(task.result())
+
+        task = s.submit(func, (3,), timeout=2, retries=1)
+        s.close()
+
     """
 
-    def __init__(self, log_path=None, worker_num=None, socket=None):
+    def __init__(self, log_path=None, worker_num=None, socket=None, result_dir=None, timeout=None, retries=0, backoff=1.0):
         """init function"""
         self.counter = 0
-        self.tasks = {}
+        self.id = uuid.uuid4().hex
+        # the state of every task by its id, and the counts of every state, so that the status is known without a scan
+        self.states = []
+        self.counts = {"waiting": 0, "running": 0, "retrying": 0, "failed": 0, "timeout": 0, "finished": 0}
+        self.errors = {}
+        self.outputs = {}
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        # only for tasks that are not done yet: their attempt, options and payload, and the retries due
+        self.attempts = {}
+        self.options = {}
+        self.payloads = {}
+        self.due = []
+        # results that were not handed out yet, the paths of those written to the result directory
+        self.results = {}
+        self.files = {}
+        self.result_dir = result_dir
+        # messages may be processed by several threads waiting for results, while tasks are added
+        self.lock = RLock()
         self.waiting = Queue()
         self.messages = Queue()
         self.log_path = log_path
         self.worker_num = worker_num
         self.socket = socket
+        self.workers = []
+        self.slots = []
+        self.closed = False
 
     def add_task(self, func, *args, **kwargs):
-        """add a task function and its input parameters to the queue"""
-        task = {"func": func, "args": args, "kwargs": kwargs, "status": "waiting"}
-        _id = len(self.tasks)
-        if self.log_path is not None:
-            task["log_path"] = os.path.join(self.log_path, "task-{}.log".format(_id))
-        else:
-            task["log_path"] = None
-        self.tasks[_id] = task
-        self.waiting.put(_id)
+        """add a task function and its input parameters to the queue, also while the session is running
+
+        Returns a :class:`TaskFuture` of the return value of the function.
+        """
+        return self.submit(func, args, kwargs)
+
+    def submit(self, func, args=(), kwargs=None, timeout=None, retries=None):
+        """add a task with its own timeout and number of retries, the defaults of the session are used if not given
+
+        Returns a :class:`TaskFuture` of the return value of the function.
+        """
+        if self.closed:
+            raise RuntimeError("The session is closed, create a new one")
+        _id = len(self.states)
+        log_path = os.path.join(self.log_path, "task-{}.log".format(_id)) if self.log_path is not None else None
+        # pickled here, so that a function that can not be sent to the workers fails right away,
+        # the session only keeps the state of the task, and its payload as long as it may be retried
+        payload = pickle.dumps((func, args, kwargs or {}, log_path), pickle.HIGHEST_PROTOCOL)
+        with self.lock:
+            _id = len(self.states)
+            if timeout is not None or retries is not None:
+                self.options[_id] = (timeout, retries)
+            if self.task_retries(_id):
+                self.payloads[_id] = payload
+            self.states.append("waiting")
+            self.counts["waiting"] += 1
+            self.attempts[_id] = 0
+        self.waiting.put((_id, 0, payload, self.task_timeout(_id)))
+        return TaskFuture(self, _id)
+
+    def task_timeout(self, task_id):
+        timeout = self.options.get(task_id, (None, None))[0]
+        return timeout if timeout is not None else self.timeout
+
+    def task_retries(self, task_id):
+        retries = self.options.get(task_id, (None, None))[1]
+        return retries if retries is not None else self.retries
+
+    def set_state(self, task_id, state):
+        """change the state of a task and update the counts"""
+        self.counts[self.states[task_id]] -= 1
+        self.counts[state] += 1
+        self.states[task_id] = state
 
     def create_workers(self, worker_num=None):
-
-        def worker(waiting, messages, tasks):
-            pid = os.getpid()
-            messages.put(("message", "worker {} started".format(pid)))
-            while not waiting.empty():
-                task_id = waiting.get()
-                task = tasks[task_id]
-                messages.put(("task_running", task_id))
-                with captured(task_id, log_path=task["log_path"]) as c:
-                    def output_reader(proc):
-                        if proc.log_path:
-                            messages.put(("message", "task-{}: streaming log to {}".format(proc.name, proc.log_path)))
-                            return
-                        out = proc.outfile
-                        lastpos = 0
-                        while True:
-                            if out.tell() != lastpos:
-                                out.seek(lastpos)
-                                line = out.read()
-                                if line[-16:] == TASK_FINISHED:
-                                    break
-                                messages.put(("task_log", "task-{} log: {}".format(proc.name, line)))
-                                lastpos = out.tell()
-                            time.sleep(0.05)
-
-                    t = Thread(target=output_reader, args=(c,))
-                    t.start()
-
-                    try:
-                        task["func"](*task["args"], **task["kwargs"])
-                        print(TASK_FINISHED, end="")
-                        t.join()
-                        messages.put(("task_finished", task_id))
-                        c.finished = True
-                    except Exception:
-                        traceback.print_exc()
-                        print(TASK_FINISHED, end="")
-                        t.join()
-                        messages.put(("task_failed", task_id))
-
-            messages.put(("message", "worker {} terminated".format(pid)))
-
         if self.worker_num is None:
+            # tasks may still be added after the start, idle workers only wait for them
             self.worker_num = cpu_count()
-        if self.worker_num > len(self.tasks):
-            self.worker_num = len(self.tasks)
 
         self.log("using {} workers".format(self.worker_num))
-        self.workers = [Process(target=worker, args=(self.waiting, self.messages, self.tasks)) for i in range(self.worker_num)]
+        self.slots = [Array('i', [-1, -1], lock=False) for i in range(self.worker_num)]
+        self.workers = [self.create_worker(i) for i in range(self.worker_num)]
 
-    def process_message(self):
+    def create_worker(self, index):
+        return Process(target=work, args=(self.waiting, self.messages, self.id, self.result_dir, self.slots[index]))
 
-        msg_type, content = self.messages.get()
+    def process_message(self):
+        """process the next message of the workers, then handle timeouts and retries that are due"""
+        with self.lock:
+            timeout = self.wait_time()
+        try:
+            message = self.messages.get(timeout=timeout)
+        except Empty:
+            message = None
+        with self.lock:
+            if message is not None:
+                self.handle_message(*message)
+            self.check_tasks()
+
+    def handle_message(self, msg_type, content):
+        if msg_type in ("task_running", "task_finished", "task_failed", "task_timeout") and content[1] != self.attempts.get(content[0]):
+            # from an attempt whose worker died, the task was given up or is retried already
+            return
 
         if msg_type == "task_running":
-            key = content
-            self.tasks[key]["status"] = "running"
+            key, attempt, pid = content
+            self.set_state(key, "running")
             self.log("task-{}: started".format(key))
 
         elif msg_type == "task_finished":
-            key = content
-            self.tasks[key]["status"] = "finished"
+            key, attempt, (result, path) = content
+            if path is None:
+                self.results[key] = pickle.loads(result)
+            else:
+                self.files[key] = path
+            self.set_state(key, "finished")
+            self.forget(key)
             self.log("task-{}: finished".format(key))
 
         elif msg_type == "task_failed":
-            key = content
-            self.tasks[key]["status"] = "failed"
-            self.log("task-{}: failed".format(key))
+            key, attempt, error = content
+            self.errors[key] = error
+            self.give_up(key, "failed")
+
+        elif msg_type == "task_timeout":
+            key, attempt, timeout = content
+            self.errors[key] = "timed out after {}s".format(timeout)
+            self.give_up(key, "timeout")
         elif msg_type == "task_log":
-            self.log(content, end="")
+            key, text = content
+            if key not in self.outputs:
+                self.outputs[key] = deque(maxlen=LOG_LINES)
+            self.outputs[key].extend(text.splitlines())
+            self.log("task-{} log: {}".format(key, text), end="")
         else:
             self.log(content)
 
+    def wait_time(self):
+        """seconds until the next retry is due or the workers are checked, None if there is nothing to wait for"""
+        times = []
+        if self.due:
+            times.append(self.due[0][0])
+        if self.workers and not self.closed and not self.all_finished():
+            # workers may die at any time, also before their task is known to be running
+            times.append(time.time() + CHECK_INTERVAL)
+        if not times:
+            return None
+        return max(0, min(times) - time.time())
+
+    def check_tasks(self):
+        """replace workers that died and give up or retry their tasks, and queue the retries that are due"""
+        now = time.time()
+        for index, worker in enumerate(self.workers):
+            if self.closed or worker.is_alive():
+                continue
+            # the worker exited without sending the result, it crashed or was killed by someone else
+            key, attempt = self.slots[index]
+            self.respawn(index)
+            if key >= 0 and self.attempts.get(key) == attempt:
+                self.errors[key] = "worker {} died with exit code {}".format(worker.pid, worker.exitcode)
+                self.give_up(key, "failed")
+
+        while self.due and self.due[0][0] <= now:
+            _, key = heapq.heappop(self.due)
+            self.set_state(key, "waiting")
+            self.waiting.put((key, self.attempts[key], self.payloads[key], self.task_timeout(key)))
+
+    def respawn(self, index):
+        """replace a worker that died"""
+        old = self.workers[index]
+        self.slots[index][0] = -1
+        self.workers[index] = self.create_worker(index)
+        self.workers[index].start()
+        self.log("worker {} replaced by worker {}".format(old.pid, self.workers[index].pid))
+
+    def give_up(self, task_id, state):
+        """mark a task as failed or timed out, or retry it after a backoff if it has retries left"""
+        attempt = self.attempts[task_id]
+        retries = self.task_retries(task_id)
+        if attempt < retries and not self.closed:
+            delay = self.backoff * 2 ** attempt
+            heapq.heappush(self.due, (time.time() + delay, task_id))
+            # messages of the attempt that was given up are ignored from now on
+            self.attempts[task_id] = attempt + 1
+            self.set_state(task_id, "retrying")
+            self.log("task-{}: {}, retrying in {}s ({} of {})".format(task_id, state, delay, attempt + 1, retries))
+        else:
+            self.set_state(task_id, state)
+            self.forget(task_id)
+            self.log("task-{}: {}".format(task_id, "timed out" if state == "timeout" else state))
+
+    def forget(self, task_id):
+        """drop what is only needed while a task is not done"""
+        self.attempts.pop(task_id, None)
+        self.options.pop(task_id, None)
+        self.payloads.pop(task_id, None)
+
     def log(self, *args, **kwargs):
         print(self.status, "________", *args, **kwargs)
         if self.socket is not None:
-            msg = (self.status, "________", args)
-            data = json.dumps({"listen": msg})
-            self.socket.sendMessage(data.encode())
+            # also from threads of the server waiting for results while holding the lock, which the event loop takes
+            # to add tasks, so they must not wait for a slow client: logs are dropped then
+            self.socket.push({"listen": (self.status, "________", args)}, overflow="drop")
 
     def start(self):
-        """kick off the execution of tasks"""
+        """kick off the execution of tasks, the workers keep waiting for new tasks until :meth:`close`"""
+        if self.workers:
+            raise RuntimeError("The session is already started")
         self.log("START")
         self.create_workers()
         for worker in self.workers:
             worker.start()
+        # idle workers would keep the interpreter from exiting if the session was never closed,
+        # the session is only kept alive for that until it is closed
+        atexit.register(self.close)
 
     def listen(self):
-        """listen to the task messages until all finished"""
+        """listen to the task messages until all tasks added so far finished"""
         while not self.all_finished() or not self.messages.empty():
             self.process_message()
         self.log("FINISHED")
 
+    def result(self, task_id):
+        """wait for a task and hand out its result, raises :class:`TaskError` if it failed
+
+        The result is dropped from the session once it is handed out, it can only be requested once.
+        """
+        while self.states[task_id] not in DONE:
+            if not self.workers or self.closed and not any(worker.is_alive() for worker in self.workers):
+                raise RuntimeError("task-{} will not run, the session is not started or closed".format(task_id))
+            self.process_message()
+        if self.states[task_id] != "finished":
+            raise TaskError("task-{} failed:\n{}".format(task_id, self.errors[task_id]))
+        with self.lock:
+            if task_id in self.results:
+                return self.results.pop(task_id)
+            if task_id not in self.files:
+                raise RuntimeError("The result of task-{} was handed out already".format(task_id))
+            path = self.files.pop(task_id)
+        result = load_result(path)
+        try:
+            # a memory-mapped result stays readable after its file is deleted
+            os.remove(path)
+        except OSError:
+            pass
+        return result
+
+    def logs(self, task_id):
+        """the last lines of output of a task, if it was not logged to a file"""
+        return list(self.outputs.get(task_id, ()))
+
+    def close(self, wait=True):
+        """let the workers exit once the tasks added so far are done, and wait for them unless told otherwise
+
+        Without waiting, tasks that fail or time out from now on are not retried.
+        """
+        if self.closed:
+            return
+        if wait and self.workers:
+            # retries are queued while waiting, before the workers are told to exit
+            while not self.all_finished():
+                self.process_message()
+        self.closed = True
+        atexit.unregister(self.close)
+        for worker in self.workers:
+            self.waiting.put(None)
+        if not wait:
+            self.drop_results()
+            return
+        while any(worker.is_alive() for worker in self.workers):
+            # workers only exit once their messages are read
+            while not self.messages.empty():
+                self.process_message()
+            for worker in self.workers:
+                worker.join(0.1)
+        while not self.messages.empty():
+            self.process_message()
+        self.drop_results()
+        self.log("CLOSED")
+
+    def drop_results(self):
+        """drop the results that were not handed out, also their files in the result directory
+
+        Only files named after the id of this session are deleted, the directory may be shared.
+        """
+        with self.lock:
+            self.results.clear()
+            self.files.clear()
+            if self.result_dir and os.path.isdir(self.result_dir):
+                # also files of tasks that were stopped before their result was reported
+                for name in os.listdir(self.result_dir):
+                    if name.startswith(self.id):
+                        try:
+                            os.remove(os.path.join(self.result_dir, name))
+                        except OSError:
+                            pass
+
     @property
     def status(self):
-        s = {"waiting": 0, "running": 0, "failed": 0, "finished": 0, "total": len(self.tasks)}
-        for k in self.tasks:
-            for key in s:
-                if self.tasks[k]['status'] == key:
-                    s[key] += 1
+        s = dict(self.counts)
+        s["total"] = len(self.states)
         return s
 
     def all_finished(self):
-        return self.status["finished"] + self.status["failed"] == self.status["total"]
+        return self.counts["finished"] + self.counts["failed"] + self.counts["timeout"] == len(self.states)
 
     def terminate(self):
+        """stop the workers right away, also the tasks that are running"""
+        self.closed = True
+        atexit.unregister(self.close)
         for w in self.workers:
             w.terminate()
+        self.drop_results()
 
     def summary(self):
         pass
@@ -235,3 +698,7 @@ if __name__ == '__main__':
 
     s.start()
     s.listen()
+
+    task = s.add_task(func, 2)
+    print(task.result())
+    s.close()
@@ -0,0 +1,120 @@
+import json
+import os
+import signal
+import socket
+import sys
+import traceback
+
+from compas_cloud.proxy import read_line
+from compas_cloud.proxy import ZYGOTE_PORT
+from compas_cloud.server import preload
+from compas_cloud.server import serve
+
+
+__all__ = ['Zygote']
+
+
+class Zygote(object):
+    """A long-lived process with all modules imported that forks a new server for every request.
+
+    A :class:`Proxy` created with ``zygote=True`` asks the zygote for a new server instead of starting
+    a new Python process, so that the server is ready without importing anything.
+    Every forked server is an isolated process that serves until it is shut down, ``Proxy.once`` works as usual.
+    Sessions started by such a server fork their workers from it, so they do not import again either.
+    Only available on platforms that support ``os.fork``.
+
+    Parameters
+    ----------
+    port : int, optional
+        The port the zygote listens at for requests of new servers.
+        Default is ``9008``.
+    preload_modules : list of str, optional
+        Modules or functions imported before forking, in addition to the modules of the server.
+    options : dict, optional
+        Passed to :func:`compas_cloud.server.serve` in every forked server.
+
+    Examples
+    --------
+
+    .. code-block:: bash
+
+        python -m compas_cloud.zygote --preload compas.numerical
+
+    .. code-block:: python
+
+        from compas_cloud import Proxy
+        proxy = Proxy(port=0, zygote=True)
+
+    """
+
+    def __init__(self, port=ZYGOTE_PORT, preload_modules=(), **options):
+        self.port = port
+        self.preload_modules = preload_modules
+        self.options = options
+
+    def serve_forever(self):
+        """answer requests of new servers until interrupted"""
+        preload(self.preload_modules)
+        # forked servers are reaped automatically
+        signal.signal(signal.SIGCHLD, signal.SIG_IGN)
+
+        listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        listener.bind(('127.0.0.1', self.port))
+        listener.listen(16)
+        print("zygote ready at 127.0.0.1:{}".format(self.port))
+        sys.stdout.flush()
+
+        try:
+            while True:
+                connection, _ = listener.accept()
+                try:
+                    request = json.loads(read_line(connection))
+                    pid = self.fork(request, listener, connection)
+                    connection.sendall((json.dumps({'pid': pid}) + '\n').encode())
+                except Exception:
+                    traceback.print_exc()
+                finally:
+                    connection.close()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            listener.close()
+            print("zygote stopped")
+
+    def fork(self, request, listener, connection):
+        """fork a server that listens at the requested port and reports to the ready port of the proxy"""
+        pid = os.fork()
+        if pid:
+            print("forked server {} for port {}".format(pid, request['port']))
+            return pid
+
+        code = 0
+        try:
+            signal.signal(signal.SIGCHLD, signal.SIG_DFL)
+            listener.close()
+            connection.close()
+            serve('127.0.0.1', request['port'], ready_port=request.get('ready_port'), **self.options)
+        except BaseException:
+            traceback.print_exc()
+            code = 1
+        finally:
+            sys.stdout.flush()
+            os._exit(code)
+
+
+if __name__ == '__main__':
+
+    import argparse
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--port", type=int, default=ZYGOTE_PORT, help="port to listen at for requests of new servers")
+    parser.add_argument("--preload", action='append', default=[], help="comma separated modules or functions imported before forking")
+    parser.add_argument("--pool", choices=['thread', 'process'], default='thread', help="where function calls of the servers are executed")
+    args = parser.parse_args()
+
+    if not hasattr(os, 'fork'):
+        parser.error("the zygote is only supported on platforms with os.fork")
+
+    preload_modules = [name.strip() for names in args.preload for name in names.split(',') if name.strip()]
+    Zygote(args.port, preload_modules, pool=args.pool).serve_forever()
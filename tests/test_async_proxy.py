@@ -0,0 +1,54 @@
+import asyncio
+import pytest
+
+from compas_cloud import AsyncProxy
+from compas_cloud import Proxy
+from compas.geometry import Translation
+from compas.geometry import allclose
+
+
+def progress(callback, steps):
+    for k in range(steps):
+        callback(k)
+    return steps
+
+
+def test_async_proxy():
+    proxy = Proxy(port=9104, once=False)
+
+    async def main():
+        async with AsyncProxy(port=9104) as aproxy:
+            transform_points_numpy = aproxy.function('compas.geometry.transform_points_numpy')
+            T = Translation.from_vector([100, 0, 0])
+            results = await asyncio.gather(*[transform_points_numpy([[i, 0, 0]], T) for i in range(10)])
+            for i, result in enumerate(results):
+                assert allclose(result, [[100 + i, 0, 0]])
+
+            pts = await aproxy.cache([[0, 0, 0]])
+            assert await aproxy.get(pts) == [[0, 0, 0]]
+
+            repeat = aproxy.function('itertools.repeat')
+            assert [value async for value in await repeat('x', 20)] == ['x'] * 20
+
+            assert await aproxy.check() == {'status': "I'm good"}
+
+            # errors of callbacks are printed, the proxy keeps receiving replies
+            def broken(k):
+                raise ValueError("callback failed on purpose")
+
+            async def broken_coroutine(k):
+                raise ValueError("callback failed on purpose")
+
+            remote_progress = aproxy.function(progress)
+            assert await remote_progress(broken, 2) == 2
+            assert await remote_progress(broken_coroutine, 2) == 2
+            assert await aproxy.check() == {'status': "I'm good"}
+
+        # requests fail right away once the connection is closed
+        with pytest.raises(ConnectionError):
+            await aproxy.check()
+
+    try:
+        asyncio.run(main())
+    finally:
+        proxy.shutdown()
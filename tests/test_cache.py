@@ -0,0 +1,105 @@
+import time
+
+import numpy as np
+import pytest
+from compas.geometry import Point
+
+from compas_cloud.cache import Cache
+from compas_cloud.cache import EvictedError
+from compas_cloud.cache import estimate_size
+
+
+def test_estimate_size():
+    assert estimate_size(np.zeros((1000, 3))) == 24000
+    assert estimate_size([np.zeros(1000)] * 2) > 16000
+    assert estimate_size(Point(1, 2, 3)) > estimate_size([1.0, 2.0, 3.0])
+
+
+def test_lru_entries():
+    cache = Cache(max_entries=2)
+    a = cache.add('a')
+    b = cache.add('b')
+    assert cache[a] == 'a'
+    c = cache.add('c')
+
+    assert len(cache) == 2
+    assert cache[a] == 'a'
+    assert cache[c] == 'c'
+    with pytest.raises(EvictedError):
+        cache[b]
+    with pytest.raises(KeyError):
+        cache['unknown']
+
+
+def test_memory_budget():
+    cache = Cache(max_memory=10000)
+    keys = [cache.add(np.zeros(500)) for _ in range(4)]
+    assert cache.memory <= 10000
+    assert keys[-1] in cache
+    assert keys[0] not in cache
+    assert cache.stats()['evictions'] == 2
+
+    # an entry larger than the budget is kept on its own
+    key = cache.add(np.zeros(5000))
+    assert len(cache) == 1 and key in cache
+
+
+def test_ttl():
+    cache = Cache(ttl=0.1)
+    a = cache.add('a')
+    b = cache.add('b', ttl=10)
+    time.sleep(0.2)
+    with pytest.raises(EvictedError):
+        cache[a]
+    assert cache[b] == 'b'
+
+
+def test_extend():
+    cache = Cache()
+    cache.set('a', 'a', ttl=0.1)
+    cache.set('b', 'b', ttl=0.1)
+    cache.set('c', 'c', ttl=0.1)
+    cache.extend('a')
+    cache.extend('b', ttl=10)
+    cache.extend('c', ttl=0.01)
+    time.sleep(0.2)
+    assert cache['a'] == 'a' and cache['b'] == 'b'
+    with pytest.raises(EvictedError):
+        cache['c']
+
+
+def test_disk_tier(tmp_path):
+    cache = Cache(max_entries=1, directory=str(tmp_path))
+    array = cache.add(np.arange(1000.0))
+    point = cache.add(Point(1, 2, 3))
+    assert len(cache) == 1
+    assert (tmp_path / (array + '.npy')).exists()
+
+    result = cache[array]
+    assert isinstance(result, np.memmap)
+    assert (result == np.arange(1000.0)).all()
+    assert (tmp_path / (point + '.pickle')).exists()
+
+    # entries survive a restart of the server
+    cache.flush()
+    cache = Cache(directory=str(tmp_path))
+    assert cache[point] == Point(1, 2, 3)
+    assert (cache[array] == np.arange(1000.0)).all()
+    assert '../unknown' not in cache
+
+
+def test_disk_budget(tmp_path):
+    cache = Cache(max_entries=1, directory=str(tmp_path), max_disk=20000)
+    keys = [cache.add(np.full(1000, float(i))) for i in range(4)]
+    # 8 kB per array, the oldest file is deleted once the third one is written
+    assert not (tmp_path / (keys[0] + '.npy')).exists()
+    assert cache.disk <= 20000
+    with pytest.raises(EvictedError):
+        cache[keys[0]]
+    assert (cache[keys[1]] == 1.0).all()
+
+    # replaced entries and cleared caches leave no files behind
+    cache.set(keys[1], 'replaced')
+    assert not (tmp_path / (keys[1] + '.npy')).exists()
+    cache.clear()
+    assert not list(tmp_path.iterdir())
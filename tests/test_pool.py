@@ -0,0 +1,39 @@
+from compas_cloud import ProxyPool
+from compas.geometry import Translation
+from compas.geometry import allclose
+
+
+def test_pool():
+    pool = ProxyPool([('127.0.0.1', 9101), ('127.0.0.1', 9102)], retry_interval=60)
+    T = Translation.from_vector([100, 0, 0])
+
+    results = pool.map('compas.geometry.transform_points_numpy', [([[i, 0, 0]], T) for i in range(6)])
+    for i, result in enumerate(results):
+        assert allclose(result, [[100 + i, 0, 0]])
+    assert all(replica.latency > 0 for replica in pool.replicas)
+
+    # replies are counted when they arrive, also those whose result is never fetched
+    futures = [pool.submit('compas.geometry.transform_points_numpy', [[i, 0, 0]], T) for i in range(6)]
+    for future in futures:
+        while not future.done():
+            future.replica.proxy.receive()
+    assert all(replica.outstanding == 0 for replica in pool.replicas)
+
+    # calls fail over to the remaining replica once a server is gone
+    pool.replicas[0].proxy._process.kill()
+    pool.replicas[0].proxy._process.wait()
+    results = pool.map('compas.geometry.transform_points_numpy', [([[i, 0, 0]], T) for i in range(4)])
+    for i, result in enumerate(results):
+        assert allclose(result, [[100 + i, 0, 0]])
+    assert not pool.replicas[0].healthy
+
+    # a restarted server shuts down with its client, like the one started first
+    pool.retry_interval = 0
+    assert allclose(pool.run('compas.geometry.transform_points_numpy', [[0, 0, 0]], T), [[100, 0, 0]])
+    restarted = pool.replicas[0]
+    assert restarted.healthy
+    restarted.proxy.client.disconnect()
+    restarted.proxy._process.wait(timeout=10)
+    restarted.fail()
+
+    pool.shutdown()
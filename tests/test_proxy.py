@@ -3,6 +3,7 @@ from compas.geometry import Translation
 from compas.geometry import transform_points
 from compas.geometry import allclose
 import time
+import numpy as np
 import pytest
 
 PROXY = None
@@ -24,6 +25,20 @@ def test_basic(proxy):
     assert allclose(result, [[100, 0, 0], [101, 0, 0]])
 
 
+def test_big_integers(proxy):
+    factorial = proxy.function('math.factorial')
+    assert factorial(30) == 265252859812191058636308480000000
+
+
+def test_binary(proxy):
+    transform_points_numpy = proxy.function('compas.geometry.transform_points_numpy')
+    pts = np.array([[0, 0, 0], [1, 0, 0]], dtype=float)
+    T = Translation.from_vector([100, 0, 0])
+    result = transform_points_numpy(pts, T)
+    assert isinstance(result, np.ndarray)
+    assert allclose(result, [[100, 0, 0], [101, 0, 0]])
+
+
 def test_benchmark(proxy):
 
     pts = [[i, 0, 0] for i in range(0, 1000)]
@@ -58,7 +73,7 @@ def test_benchmark(proxy):
     end = time.time()
     print('transform 1k points 100 times (cloud numpy): ', end - start, 's')
 
-    assert result1 == result2
+    assert allclose(result1, result2)
 
 
 
@@ -94,6 +109,230 @@ def test_cached(proxy):
     assert allclose(result, [[100, 0, 0], [101, 0, 0]])
 
 
+def test_dedup(proxy):
+    pts = np.random.rand(10000, 3)
+    first = proxy.cache(pts)
+    assert proxy.cache(pts.copy()) == first
+    pts[0] = 0
+    second = proxy.cache(pts)
+    assert second != first
+    assert allclose(proxy.get(second), pts)
+    assert proxy.cache([[0, 0, 0]]) == proxy.cache([[0, 0, 0]])
+
+    # data cached under its hash is shared, functions change copies of it
+    original = [[1, 0, 0], [2, 0, 0]]
+    shared = proxy.cache(original)
+    scale = proxy.function(scale_in_place)
+    scale(shared, 100)
+    assert proxy.get(shared) == original
+    assert proxy.cache(original) == shared
+    # data cached by a function is not shared and can be changed in place
+    scaled = proxy.function('copy.deepcopy', cache=True)(shared)
+    scale(scaled, 100)
+    assert proxy.get(scaled) == [[100, 0, 0], [200, 0, 0]]
+    assert proxy.get(shared) == original
+    assert proxy.send({'cache': [[5, 0, 0]], 'hash': 'f' * 64}) != {'cached': 'f' * 64}
+
+
+def scale_in_place(points, factor):
+    for point in points:
+        point[0] *= factor
+
+
+def test_memoize(proxy):
+    now = proxy.function('time.time', memoize=True)
+    hits = proxy.stats()['memo']['hits']
+    assert now() == now()
+    assert proxy.function('time.time')() != now()
+    assert proxy.stats()['memo']['hits'] == hits + 2
+
+    pts = proxy.cache([[0, 0, 0]])
+    norms = proxy.function('numpy.linalg.norm', memoize=True)
+    assert norms(pts, axis=1) == norms(pts, axis=1)
+    assert proxy.stats()['memo']['hits'] == hits + 3
+
+    # keyword arguments match in any order, and changing a cached result leaves the memoized one intact
+    full = proxy.function('numpy.full', cache=True, memoize=True)
+    first = full(shape=(2, 3), fill_value=1.0)
+    proxy.function(scale_in_place)(first, 100)
+    second = full(fill_value=1.0, shape=(2, 3))
+    assert proxy.stats()['memo']['hits'] == hits + 4
+    assert allclose(proxy.get(second), np.ones((2, 3)))
+
+
+def test_submit(proxy):
+    transform_points_numpy = proxy.function('compas.geometry.transform_points_numpy')
+    T = Translation.from_vector([100, 0, 0])
+    futures = [transform_points_numpy.submit([[i, 0, 0]], T) for i in range(5)]
+    assert not futures[-1].done()
+    for i, future in reversed(list(enumerate(futures))):
+        assert allclose(future.result(), [[100 + i, 0, 0]])
+
+
+def test_batch(proxy):
+    T = Translation.from_vector([100, 0, 0])
+    with proxy.batch() as batch:
+        transform_points_numpy = batch.function('compas.geometry.transform_points_numpy', cache=True)
+        pts = batch.cache([[0, 0, 0], [1, 0, 0]])
+        moved = transform_points_numpy(pts, T)
+        moved = transform_points_numpy(moved, T)
+        result = batch.get(moved)
+
+    assert len(batch.results) == 4
+    assert 'cached' in batch.result(pts)
+    assert allclose(batch.result(result), [[200, 0, 0], [201, 0, 0]])
+
+
+def test_pipeline(proxy):
+    T = Translation.from_vector([1, 0, 0])
+    pipeline = proxy.pipeline()
+    pipeline.add('compas.geometry.transform_points_numpy', pipeline.PREVIOUS, T)
+    pipeline.add('compas.geometry.transform_points_numpy', T)
+
+    pts = proxy.cache([[0, 0, 0], [1, 0, 0]])
+    result = pipeline.run(pts, repeat=50)
+    assert allclose(result, [[100, 0, 0], [101, 0, 0]])
+
+    result = pipeline.run(pts, repeat=2, cache=True)
+    assert allclose(proxy.get(result), [[4, 0, 0], [5, 0, 0]])
+
+
+def test_stream(proxy):
+    repeat = proxy.function('itertools.repeat')
+    values = repeat('x', 40)
+    assert list(values) == ['x'] * 40
+
+    values = repeat('y', 100)
+    assert next(values) == 'y'
+    values.close()
+
+
+def slow_values(n):
+    import time
+    for i in range(n):
+        time.sleep(0.5)
+        yield i
+
+
+def test_stream_concurrent(proxy):
+    values = proxy.function(slow_values)(3)
+    start = time.time()
+    assert proxy.check() == {'status': "I'm good"}
+    assert time.time() - start < 0.4
+    assert list(values) == [0, 1, 2]
+
+
+def nap(seconds):
+    import time
+    time.sleep(seconds)
+    return seconds
+
+
+def test_sessions_result(proxy):
+    s = proxy.Sessions(worker_num=1)
+    task = s.add_task(nap, 1)
+    s.start()
+    future = proxy.request({'sessions': {'command': 'result', 'task': task.id, 'cache': False, 'args': (), 'kwargs': {}}})
+    # waiting for the task does not hold up other requests
+    start = time.time()
+    assert proxy.check() == {'status': "I'm good"}
+    assert time.time() - start < 0.5
+    assert future.result() == 1
+    s.close()
+
+
+def test_reply_error(proxy):
+    from compas_cloud.proxy import ServerSideError
+    with pytest.raises(ServerSideError, match="not JSON serializable"):
+        proxy.function('builtins.object').submit().result()
+    assert proxy.check() == {'status': "I'm good"}
+    assert proxy.check() == {'status': "I'm good"}
+
+
+def test_concurrent(proxy):
+    sleep = proxy.function('time.sleep')
+    start = time.time()
+    future = sleep.submit(2)
+    assert proxy.check() == {'status': "I'm good"}
+    assert time.time() - start < 1
+    future.result()
+    assert time.time() - start >= 2
+
+
+def test_disconnect(proxy):
+    from compas_cloud.client_websockets import Client_Websockets
+    client = Client_Websockets(proxy.host, proxy.port)
+    client.disconnect()
+    assert client.loop.is_closed()
+
+
+def test_deflate_threshold(proxy):
+    import asyncio
+    import websockets
+    from websockets.frames import Frame, Opcode
+    from compas_cloud.client_websockets import ThresholdDeflateFactory
+    from compas_cloud.serialization import COMPRESSION_THRESHOLD
+
+    async def encode():
+        # without codecs offered as subprotocols the server accepts per-message deflate
+        uri = "ws://{}:{}".format(proxy.host, proxy.port)
+        async with websockets.connect(uri, compression=None, extensions=[ThresholdDeflateFactory()]) as websocket:
+            deflate, = websocket.protocol.extensions
+            small = deflate.encode(Frame(Opcode.TEXT, b'x' * 10))
+            large = deflate.encode(Frame(Opcode.TEXT, b'x' * COMPRESSION_THRESHOLD))
+            return small.rsv1, large.rsv1
+
+    assert asyncio.run(encode()) == (False, True)
+
+
+def iterate(callback, iterations):
+    import time
+    import numpy as np
+    xyz = np.zeros((100, 3))
+    for k in range(iterations):
+        xyz[k % 100] = k
+        callback(k, xyz)
+        time.sleep(0.001)
+    return iterations
+
+
+def test_callback(proxy):
+    received = []
+    remote_iterate = proxy.function(iterate)
+    assert remote_iterate(lambda k, xyz: received.append(k), 50) == 50
+    assert received == list(range(50))
+
+    received = []
+    arrays = []
+
+    def preview(k, xyz):
+        received.append(k)
+        arrays.append(xyz)
+
+    remote_iterate(proxy.callback(preview, rate=50, coalesce=True, delta=True), 200)
+    assert 1 < len(received) < 100
+    assert received[-1] == 199
+    expected = np.zeros((100, 3))
+    for k in range(200):
+        expected[k % 100] = k
+    assert allclose(arrays[-1], expected)
+
+
+def progress(callback, steps):
+    import time
+    for k in range(steps):
+        callback(k)
+        time.sleep(0.2)
+    return time.time()
+
+
+def test_callback_live(proxy):
+    received = []
+    finished = proxy.function(progress)(lambda k: received.append(time.time()), 5)
+    assert len(received) == 5
+    assert received[0] < finished - 0.5
+
+
 def test_server_control(proxy):
 
     print(proxy.check())
@@ -0,0 +1,86 @@
+import numpy as np
+import pytest
+from compas.geometry import Point
+from compas.geometry import allclose
+
+from compas_cloud.serialization import compress
+from compas_cloud.serialization import dumps
+from compas_cloud.serialization import dumps_binary
+from compas_cloud.serialization import loads
+from compas_cloud.serialization import select_protocol
+from compas_cloud.serialization import subprotocols
+from compas_cloud.serialization import Codec
+from compas_cloud.serialization import COMPRESSIONS
+from compas_cloud.serialization import SERIALIZERS
+
+
+def test_binary_roundtrip():
+    data = {
+        'xyz': np.random.rand(10, 3),
+        'edges': np.arange(20, dtype=np.int32).reshape(10, 2).T,
+        'scalar': np.array(5.0),
+        'nested': [np.zeros((0, 3)), {'point': Point(1, 2, 3)}],
+        'text': 'hello',
+    }
+    result = loads(dumps_binary(data))
+
+    for key in ('xyz', 'edges', 'scalar'):
+        assert isinstance(result[key], np.ndarray)
+        assert result[key].dtype == data[key].dtype
+        assert result[key].shape == data[key].shape
+        assert (result[key] == data[key]).all()
+    assert result['xyz'].flags.writeable
+    assert result['nested'][0].shape == (0, 3)
+    assert result['nested'][1]['point'] == Point(1, 2, 3)
+    assert result['text'] == 'hello'
+
+
+def test_text_fallback():
+    result = loads(dumps({'xyz': np.ones((2, 3))}))
+    assert result['xyz'] == [[1.0, 1.0, 1.0], [1.0, 1.0, 1.0]]
+
+
+@pytest.mark.parametrize('codec', COMPRESSIONS)
+def test_compression(codec):
+    data = {'xyz': np.zeros((1000, 3)), 'faces': [[0, 1, 2]] * 1000}
+    for payload in (dumps(data), dumps_binary(data)):
+        compressed = compress(payload, codec)
+        assert len(compressed) < len(payload)
+        result = loads(compressed)
+        assert len(result['faces']) == 1000
+        assert allclose(result['xyz'], data['xyz'])
+
+
+@pytest.mark.parametrize('serializer', SERIALIZERS)
+def test_serializers(serializer):
+    data = {
+        'xyz': np.random.rand(10, 3),
+        'edges': np.arange(20, dtype=np.int32).reshape(10, 2).T,
+        'point': Point(1, 2, 3),
+        'nested': [1, 2.5, None, True, {'text': 'hello'}],
+    }
+    result = loads(Codec(serializer).encode(data))
+
+    assert allclose(result['xyz'], data['xyz'])
+    assert (result['edges'] == data['edges']).all()
+    assert result['point'] == Point(1, 2, 3)
+    assert result['nested'] == [1, 2.5, None, True, {'text': 'hello'}]
+
+
+@pytest.mark.parametrize('serializer', SERIALIZERS)
+def test_big_integers(serializer):
+    data = {'factorial': 2**70, 'negative': -2**70, 'xyz': np.ones((2, 3))}
+    result = loads(Codec(serializer).encode(data))
+
+    assert result['factorial'] == 2**70
+    assert result['negative'] == -2**70
+    assert allclose(result['xyz'], data['xyz'])
+
+
+def test_select_protocol():
+    protocol, codec = select_protocol(['unknown'] + subprotocols())
+    assert protocol == subprotocols()[0]
+    assert codec.protocol == protocol
+    protocol, codec = select_protocol(['unknown'])
+    assert protocol is None
+    assert codec.serializer == 'json' and codec.compression is None
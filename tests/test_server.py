@@ -0,0 +1,80 @@
+import os
+import signal
+import subprocess
+import sys
+import time
+
+import pytest
+
+from compas_cloud import Proxy
+from compas_cloud.server import import_function
+from compas_cloud.server import load_config
+from compas_cloud.server import preload
+from compas_cloud.server import FUNCTIONS
+
+
+@pytest.mark.skipif(not hasattr(os, 'fork'), reason="pre-forked workers need os.fork")
+def test_workers():
+    server = subprocess.Popen([sys.executable, '-m', 'compas_cloud.server', '--port', '9105', '--workers', '2'])
+    try:
+        time.sleep(3)
+        proxy = Proxy(port=9105, start_server=False)
+        pid = proxy.function('os.getpid')()
+        assert pid != server.pid
+
+        # a crashed worker is replaced while the other one keeps serving
+        os.kill(pid, signal.SIGKILL)
+        time.sleep(1)
+        for _ in range(4):
+            proxy = Proxy(port=9105, start_server=False)
+            assert proxy.check() == {'status': "I'm good"}
+        assert server.poll() is None
+
+        # a clean shutdown of one worker stops the whole server
+        proxy.shutdown()
+        assert server.wait(timeout=10) == 0
+    finally:
+        if server.poll() is None:
+            server.kill()
+
+
+def test_preload():
+    preload(['json', 'compas.geometry.transform_points_numpy', 'unknown.module'])
+    assert 'compas.geometry.transform_points_numpy' in FUNCTIONS
+    assert import_function('compas.geometry.transform_points_numpy') is FUNCTIONS['compas.geometry.transform_points_numpy']
+
+
+def test_load_config(tmpdir):
+    path = tmpdir.join('server.json')
+    path.write('{"preload": "compas.numerical", "memoize": "numpy.linalg.norm", "cache-memory": 4096}')
+    assert load_config(str(path)) == {'preload': ['compas.numerical'], 'memoize': ['numpy.linalg.norm'], 'cache_memory': 4096}
+
+
+def test_ready_port():
+    start = time.time()
+    proxy = Proxy(port=0)
+    assert proxy.port != 0
+    assert time.time() - start < 10
+    assert proxy.check() == {'status': "I'm good"}
+    proxy.shutdown()
+    proxy._process.wait(timeout=10)
+
+
+@pytest.mark.skipif(not hasattr(os, 'fork'), reason="the zygote needs os.fork")
+def test_zygote():
+    zygote = subprocess.Popen([sys.executable, '-m', 'compas_cloud.zygote', '--port', '9106'])
+    try:
+        time.sleep(3)
+        start = time.time()
+        proxy = Proxy(port=0, zygote=9106)
+        assert time.time() - start < 2
+        assert proxy._process is None
+        assert proxy.function('os.getppid')() == zygote.pid
+        proxy.shutdown()
+
+        second = Proxy(port=0, zygote=9106, once=False)
+        assert second.port != proxy.port
+        second.shutdown()
+        assert zygote.poll() is None
+    finally:
+        zygote.kill()
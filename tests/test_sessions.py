@@ -0,0 +1,180 @@
+from compas_cloud import Sessions
+from compas_cloud.sessions import SourceFunction
+from compas_cloud.sessions import TaskError
+from multiprocessing import cpu_count
+import gc
+import numpy as np
+import pickle
+import pytest
+import weakref
+
+
+def square(a):
+    print(a * a)
+    return a * a
+
+
+def fail():
+    raise ValueError("failed on purpose")
+
+
+def grid(n):
+    return np.arange(n * 3, dtype=float).reshape(n, 3)
+
+
+def test_add_running():
+    s = Sessions(worker_num=2)
+    s.add_task(square, 1)
+    s.start()
+    s.listen()
+    workers = [worker.pid for worker in s.workers]
+    s.add_task(square, 2)
+    s.add_task(square, 3)
+    s.listen()
+    assert s.status['finished'] == 3
+    assert all(worker.is_alive() for worker in s.workers)
+    assert [worker.pid for worker in s.workers] == workers
+    s.close()
+    assert not any(worker.is_alive() for worker in s.workers)
+    with pytest.raises(RuntimeError):
+        s.add_task(square, 4)
+
+
+def test_start_empty():
+    s = Sessions()
+    s.start()
+    assert len(s.workers) == cpu_count()
+    assert s.add_task(square, 5).result() == 25
+    s.close()
+    # closed sessions are not kept alive until the interpreter exits
+    session = weakref.ref(s)
+    del s
+    gc.collect()
+    assert session() is None
+
+
+def test_unpicklable():
+    s = Sessions(worker_num=1)
+    with pytest.raises(Exception):
+        s.add_task(lambda a: a, 1)
+    assert s.status['total'] == 0
+
+
+def test_source_function():
+    source = "def cube(a):\n    return a ** 3\n"
+    func = pickle.loads(pickle.dumps(SourceFunction('cube', source)))
+    assert func(3) == 27
+
+
+def test_results(tmpdir):
+    # files in the result directory that are not results of the session are kept
+    np.save(str(tmpdir.join('mydata.npy')), grid(10))
+    tmpdir.join('other.pickle').write_binary(pickle.dumps('other'))
+    kept = sorted(tmpdir.listdir())
+    s = Sessions(worker_num=2, result_dir=str(tmpdir))
+    tasks = [s.add_task(square, i) for i in range(4)]
+    failed = s.add_task(fail)
+    large = s.add_task(grid, 100000)
+    s.start()
+    assert [task.result() for task in tasks] == [0, 1, 4, 9]
+    assert all(task.done() for task in tasks)
+    # results are handed out once, the futures keep them
+    assert tasks[0].result() == 0
+    with pytest.raises(RuntimeError, match="handed out already"):
+        s.result(tasks[0].id)
+    with pytest.raises(TaskError, match="failed on purpose"):
+        failed.result()
+    result = large.result()
+    assert isinstance(result, np.memmap)
+    assert np.allclose(result, grid(100000))
+    assert sorted(tmpdir.listdir()) == kept
+
+    # results that were not handed out are dropped with the session
+    s.add_task(grid, 100000)
+    s.add_task(str, 'x' * 2**21)
+    s.close()
+    assert sorted(tmpdir.listdir()) == kept
+    assert np.allclose(np.load(str(tmpdir.join('mydata.npy'))), grid(10))
+
+
+def chatty(n):
+    import os
+    import subprocess
+    for i in range(n):
+        print('line', i)
+    os.write(1, b'from the file descriptor\n')
+    subprocess.call(['echo', 'from a subprocess'])
+
+
+def test_logs():
+    s = Sessions(worker_num=1)
+    short = s.add_task(chatty, 3)
+    long = s.add_task(chatty, 1500)
+    s.start()
+    short.result()
+    long.result()
+    s.listen()
+    assert s.logs(short.id) == ['line 0', 'line 1', 'line 2', 'from the file descriptor', 'from a subprocess']
+    lines = s.logs(long.id)
+    assert len(lines) == 1000
+    assert lines[-3] == 'line 1499'
+    s.close()
+
+
+def hang(seconds):
+    import time
+    time.sleep(seconds)
+    return seconds
+
+
+def flaky(path):
+    import os
+    if not os.path.exists(path):
+        open(path, 'w').close()
+        raise RuntimeError("license server not reachable")
+    return 'ok'
+
+
+def crash():
+    import os
+    os._exit(3)
+
+
+def test_timeout_retry(tmpdir):
+    s = Sessions(worker_num=2, backoff=0.1)
+    stuck = s.submit(hang, (30,), timeout=0.5)
+    quick = s.submit(hang, (0.1,), timeout=5)
+    retried = s.submit(flaky, (str(tmpdir.join('attempted')),), retries=2)
+    crashed = s.submit(crash)
+    s.start()
+    workers = [worker.pid for worker in s.workers]
+    with pytest.raises(TaskError, match="timed out"):
+        stuck.result()
+    assert quick.result() == 0.1
+    assert retried.result() == 'ok'
+    with pytest.raises(TaskError, match="exit code 3"):
+        crashed.result()
+    assert s.states[stuck.id] == "timeout"
+    assert s.status["timeout"] == 1 and s.status["failed"] == 1 and s.status["finished"] == 2
+    assert len(s.workers) == 2 and all(worker.is_alive() for worker in s.workers)
+    assert [worker.pid for worker in s.workers] != workers
+    assert s.add_task(hang, 0).result() == 0
+    s.close()
+
+
+def babble():
+    while True:
+        print('still going')
+
+
+def test_timeout_output():
+    s = Sessions(worker_num=1)
+    tasks = [s.submit(babble, timeout=0.2) for _ in range(5)]
+    s.start()
+    worker = s.workers[0].pid
+    for task in tasks:
+        with pytest.raises(TaskError, match="timed out"):
+            task.result()
+    assert s.add_task(square, 3).result() == 9
+    assert s.workers[0].pid == worker
+    s.close()